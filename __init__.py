@@ -1,4 +1,5 @@
 from Nova2.nova import *
 from Nova2.app.llm_data import *
 from Nova2.app.tts_data import *
-from Nova2.app.stt_data import *
\ No newline at end of file
+from Nova2.app.stt_data import *
+from Nova2.app.audio_source import MicrophoneSource, FileReplaySource, ArraySource
\ No newline at end of file
@@ -4,7 +4,7 @@ Description: Abstract definition of the tool API. Used for DI.
 
 from pathlib import Path
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Tuple, Dict, Generator, Literal
 
 from Nova2.app.interfaces import (
     STTConditioningBase,
@@ -18,6 +18,7 @@ from Nova2.app.interfaces import (
     MemoryConfigBase,
     AudioDataBase,
     ContextGeneratorBase,
+    AudioSourceBase,
 )
 
 class APIAbstract(ABC):
@@ -91,6 +92,18 @@ class APIAbstract(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def configure_memory_embedding_model(self, device: str | None = None, half_precision: bool = False, idle_timeout: float = 0.0) -> None:
+        """
+        Configure how the text embedding model of the memory database is run. The model is loaded on its next use.
+
+        Arguments:
+            device (str | None): The device to run the model on. None uses cuda if it is available and the CPU otherwise. Defaults to None.
+            half_precision (bool): Whether to run the model in float16 on cuda devices. Defaults to False.
+            idle_timeout (float): After how many seconds without use the model is unloaded to free its memory. 0 keeps it loaded. Defaults to 0.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def run_llm(self, conversation: ConversationBase, memory_config: MemoryConfigBase = None, tools: List[LLMToolBase] = None, instruction: str = "") -> LLMResponseBase: # type: ignore
         """
@@ -130,6 +143,97 @@ class APIAbstract(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def transcribe_file(self, path: Path) -> ContextGeneratorBase:
+        """
+        Transcribe a WAV or FLAC file with the Speech-to-Text system. The file is processed as fast as possible instead of at real-time pace.
+
+        Arguments:
+            path (Path): The audio file to transcribe.
+
+        Returns:
+            ContextGenerator: An object yielding the transcribed sentences as context data.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def transcribe_files(self, paths: List[Path], workers: int = 1) -> Generator[Tuple[Path, ContextDatapointBase], None, None]:
+        """
+        Transcribe multiple WAV or FLAC files in parallel with the Speech-to-Text system.
+
+        Arguments:
+            paths (list[Path]): The audio files to transcribe.
+            workers (int): How many files are processed at the same time. Defaults to 1.
+
+        Returns:
+            Generator[tuple[Path, ContextDatapoint]]: Yields each transcribed sentence together with the file it belongs to.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_stt_stream(self, source: AudioSourceBase) -> ContextGeneratorBase:
+        """
+        Start transcribing an additional audio stream, i.e. another microphone. All streams share one loaded model and are decoded in batches.
+        Uses the STT configuration that was applied last.
+
+        Arguments:
+            source (AudioSource): Where the audio of the stream is recorded from.
+
+        Returns:
+            ContextGenerator: An object yielding context data from the stream.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def calibrate_stt(self, reference_audio: Path, reference_text: str, max_word_error_rate: float = 0.15) -> Dict:
+        """
+        Benchmarks the compute types and beam sizes of the Speech-to-Text inference engine on a reference clip
+        and recommends the fastest combination within a word error budget. Does not change the configuration.
+
+        Arguments:
+            reference_audio (Path): A WAV or FLAC file.
+            reference_text (str): What is said in the reference clip.
+            max_word_error_rate (float): The highest acceptable word error rate. Defaults to 0.15.
+
+        Returns:
+            dict: "recommended" holds the fastest combination within the budget (or None), "results" holds the measurements of all combinations.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_stt_metrics(self, format: Literal["dict", "prometheus"] = "dict") -> Dict | str:
+        """
+        Returns how long each stage of the Speech-to-Text pipeline takes (queue wait, voice-activity-detection, transcription, speaker embedding and speaker resolution),
+        how often they ran and the real-time factor of the transcribed utterances.
+
+        Arguments:
+            format (Literal["dict", "prometheus"]): Whether to return a dict or a string in the Prometheus text format. Defaults to "dict".
+
+        Returns:
+            dict | str: The metrics.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_transcription_cadence(self) -> Dict[str, float]:
+        """
+        Returns how often the live audio is currently transcribed and how far the transcription lags behind the recording.
+
+        Returns:
+            dict[str, float]: "interval" and "latency" in seconds, "queue_depth" in chunks and "lag" in seconds of unprocessed audio.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_vad_stats(self) -> Dict[str, int]:
+        """
+        Returns how many audio frames of the live session each stage of the voice-activity-detection has rejected.
+
+        Returns:
+            dict[str, int]: "frames_total", "frames_rejected_gate" (rejected by the energy and zero-crossing gate), "frames_rejected_model" and "frames_speech".
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def bind_context_source(self, source: ContextGeneratorBase) -> None:
         """
@@ -266,6 +370,30 @@ class APIAbstract(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def export_voices(self, path: Path) -> None:
+        """
+        Exports all known speaker voices and all cloned TTS voices into a single archive, i.e. to move them to another machine.
+
+        Arguments:
+            path (Path): Where the archive should be written to.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def import_voices(self, path: Path, overwrite: bool = False) -> Tuple[int, int]:
+        """
+        Imports an archive created by export_voices.
+
+        Arguments:
+            path (Path): The archive to import.
+            overwrite (bool): Whether voices that already exist under the same name should be replaced. If False, they are skipped. Defaults to False.
+
+        Returns:
+            Tuple[int, int]: How many speaker voices and how many TTS voices were imported.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def huggingface_login(self):
         """
@@ -3,6 +3,7 @@ Description: Implements the main API.
 """
 
 from pathlib import Path
+from typing import Generator, Literal, Tuple
 import logging
 import time
 
@@ -10,6 +11,8 @@ from Nova2.app.tts_manager import TTSManager
 from Nova2.app.llm_manager import LLMManager
 from Nova2.app.audio_manager import AudioPlayer
 from Nova2.app.stt_manager import VoiceAnalysis
+from Nova2.app.stt_service import MultiStreamSTT
+from Nova2.app.database_manager import VoiceDatabaseManager, MemoryEmbeddingDatabaseManager
 from Nova2.app.context_manager import ContextManager, ContextDatapoint
 from Nova2.app.inference_engine_manager import InferenceEngineManager
 from Nova2.app.security_manager import SecretsManager
@@ -29,6 +32,7 @@ from Nova2.app.interfaces import (
     AudioDataBase,
     ContextGeneratorBase,
     ContextSourceBase,
+    AudioSourceBase,
 )
 
 class NovaAPI(APIAbstract):
@@ -39,6 +43,7 @@ class NovaAPI(APIAbstract):
         self._tts = TTSManager()
         self._llm = LLMManager()
         self._stt = VoiceAnalysis()
+        self._stt_service: MultiStreamSTT = None # type: ignore
 
         self._context = ContextManager()
         self._context_data = ContextManager()
@@ -73,7 +78,7 @@ class NovaAPI(APIAbstract):
     def apply_config_all(self) -> None:
         self._tts.apply_config()
         self._llm.apply_config()
-        self._stt.apply_config()
+        self.apply_config_stt()
 
     def apply_config_llm(self) -> None:
         self._llm.apply_config()
@@ -82,8 +87,16 @@ class NovaAPI(APIAbstract):
         self._tts.apply_config()
 
     def apply_config_stt(self) -> None:
+        # The streams were started with the previous configuration. They are recreated with the new one when the next stream is added
+        if self._stt_service is not None:
+            self._stt_service.close()
+            self._stt_service = None # type: ignore
+
         self._stt.apply_config()
 
+    def configure_memory_embedding_model(self, device: str | None = None, half_precision: bool = False, idle_timeout: float = 0.0) -> None:
+        MemoryEmbeddingDatabaseManager().configure_embedding_model(device=device, half_precision=half_precision, idle_timeout=idle_timeout)
+
     def load_tools(self, load_internal_tools: bool = True, **kwargs) -> list[LLMToolBase]:
         return self._tool_manager.load_tools(load_internal=load_internal_tools, **kwargs) # type: ignore
     
@@ -99,6 +112,43 @@ class NovaAPI(APIAbstract):
     def start_stt(self) -> ContextGeneratorBase:
         return ContextGenerator(self._stt.start())
 
+    def transcribe_file(self, path: Path) -> ContextGeneratorBase:
+        return ContextGenerator(self._stt.transcribe_file(path=path))
+
+    def transcribe_files(self, paths: list[Path], workers: int = 1) -> Generator[tuple[Path, ContextDatapointBase], None, None]:
+        return self._stt.transcribe_many(paths=paths, workers=workers) # type: ignore
+
+    def add_stt_stream(self, source: AudioSourceBase) -> ContextGeneratorBase:
+        if self._stt_service is None:
+            if self._stt._conditioning is None:
+                raise Exception("Failed to add STT stream. Apply an STT configuration first.")
+
+            # The streams share the models the STT system has already loaded. Models of stages that run in worker processes are loaded by the service
+            self._stt_service = MultiStreamSTT(
+                conditioning=self._stt._conditioning,
+                inference_engine=None if self._stt._runs_in_worker("asr") else self._stt._inference_engine,
+                speaker_embedding_model=None if self._stt._runs_in_worker("embedding") else self._stt._speaker_embedding_model,
+                speaker_lock=self._stt._speaker_lock
+                )
+
+        return ContextGenerator(self._stt_service.add_stream(audio_source=source).start())
+
+    def calibrate_stt(self, reference_audio: Path, reference_text: str, max_word_error_rate: float = 0.15) -> dict:
+        return self._stt.calibrate(reference_audio=reference_audio, reference_text=reference_text, max_word_error_rate=max_word_error_rate)
+
+    def get_stt_metrics(self, format: Literal["dict", "prometheus"] = "dict") -> dict | str:
+        metrics = self._stt.get_metrics()
+
+        if format == "prometheus":
+            return metrics.to_prometheus(prefix="nova_stt")
+        return metrics.to_dict()
+
+    def get_transcription_cadence(self) -> dict[str, float]:
+        return self._stt.get_transcription_cadence()
+
+    def get_vad_stats(self) -> dict[str, int]:
+        return self._stt.get_vad_stats()
+
     def bind_context_source(self, source: ContextGeneratorBase) -> None:
         self._context.record_data(source) # type: ignore
 
@@ -165,6 +215,12 @@ class NovaAPI(APIAbstract):
         eng = self._engine_manager.request_engine(name=engine, eng_type="TTS")
         eng.clone_voice(audio_dir=str(mp3file), name=name) # type: ignore
 
+    def export_voices(self, path: Path) -> None:
+        VoiceDatabaseManager().export_voices(path=path)
+
+    def import_voices(self, path: Path, overwrite: bool = False) -> Tuple[int, int]:
+        return VoiceDatabaseManager().import_voices(path=path, overwrite=overwrite)
+
     def huggingface_login(self):
         self._security.huggingface_login()
 
@@ -0,0 +1,284 @@
+"""
+Description: Provides preallocated buffers that hand audio from the recording thread to the transcription pipeline without copying.
+"""
+
+from collections import deque
+from threading import Condition
+from typing import Literal
+import time
+import warnings
+
+import numpy as np
+import torch
+
+def to_engine_input(audio: np.ndarray, input_format: Literal["numpy", "torch_cpu", "torch_device"], device: str) -> np.ndarray | torch.Tensor:
+    """
+    Converts a view of the ring buffer into the form an inference engine expects, without copying it unless it has to be moved to another device.
+
+    Arguments:
+        audio (np.ndarray): The float32 audio.
+        input_format (Literal["numpy", "torch_cpu", "torch_device"]): The input format of the engine.
+        device (str): The device the tensor is moved to for "torch_device".
+
+    Returns:
+        np.ndarray | torch.Tensor: The audio in the requested form.
+    """
+    if input_format == "numpy":
+        return audio
+
+    # Views of the ring buffer are read-only. Wrapping them in a tensor is safe as long as the tensor is not modified, so the warning torch emits is not useful
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="The given NumPy array is not writable", category=UserWarning)
+        tensor = torch.from_numpy(audio) # Shares the memory of the view
+
+    if input_format == "torch_cpu":
+        return tensor
+    return tensor.to(device)
+
+class AudioRingBuffer:
+    def __init__(self, capacity: int, block_size: int = 1600) -> None:
+        """
+        A fixed-capacity float32 ring buffer for a single producer and a single consumer.
+        The producer writes blocks in place, the consumer reads zero-copy views of any sample range that is still held by the buffer.
+        Samples are addressed by their absolute position since the buffer was created, so positions never wrap.
+
+        Arguments:
+            capacity (int): How many samples the buffer can hold.
+            block_size (int): The amount of samples the producer is expected to write at once. Only used as a hint for the audio stream.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be greater than 0")
+        if block_size <= 0:
+            raise ValueError("block_size must be greater than 0")
+
+        self._capacity = capacity
+        self.block_size = block_size
+
+        # Every sample is stored twice, so any range of up to "capacity" samples is contiguous in memory
+        self._buffer = self._allocate(capacity * 2)
+
+        self._write_position = 0 # Only modified by the producer
+        self._read_position = 0 # Only modified by the consumer
+
+        self.overruns = 0 # Amount of write calls that overwrote samples the consumer had not released yet
+        self.overrun_samples = 0 # Total amount of samples that were overwritten before being released
+
+    def _allocate(self, length: int) -> np.ndarray:
+        """
+        Allocates the memory that backs the buffer. Subclasses can override this to place the samples elsewhere, i.e. in shared memory.
+        """
+        return np.zeros(length, dtype=np.float32)
+
+    def close(self) -> None:
+        """
+        Frees resources held by the buffer. The buffer can not be used afterwards.
+        """
+        pass
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def write_position(self) -> int:
+        """
+        The absolute position after the newest sample in the buffer.
+        """
+        return self._write_position
+
+    @property
+    def read_position(self) -> int:
+        """
+        The absolute position up to which the consumer has released samples.
+        """
+        return self._read_position
+
+    @property
+    def free_space(self) -> int:
+        """
+        How many samples can be written without overwriting samples the consumer has not released yet.
+        """
+        return self._capacity - (self._write_position - self._read_position)
+
+    @property
+    def oldest_position(self) -> int:
+        """
+        The absolute position of the oldest sample that is still held by the buffer.
+        """
+        return max(0, self._write_position - self._capacity)
+
+    def write(self, data: np.ndarray) -> None:
+        """
+        Copies a block of samples into the buffer. Never allocates.
+        If the block does not fit into the space the consumer has released, the oldest samples are overwritten and an overrun is recorded.
+
+        Arguments:
+            data (np.ndarray): The samples to write. Multi-dimensional input with a single channel is flattened.
+        """
+        data = data.reshape(-1)
+        length = len(data)
+
+        if length == 0:
+            return
+
+        if length > self._capacity:
+            # Only the newest samples can be kept
+            self._write_position += length - self._capacity
+            data = data[-self._capacity:]
+            length = self._capacity
+
+        start = self._write_position % self._capacity
+        first_part = min(length, self._capacity - start)
+
+        self._buffer[start:start + first_part] = data[:first_part]
+        self._buffer[start + self._capacity:start + self._capacity + first_part] = data[:first_part]
+
+        if first_part < length:
+            rest = length - first_part
+            self._buffer[:rest] = data[first_part:]
+            self._buffer[self._capacity:self._capacity + rest] = data[first_part:]
+
+        new_write_position = self._write_position + length
+
+        overwritten = new_write_position - self._capacity - self._read_position
+        if overwritten > 0:
+            self.overruns += 1
+            self.overrun_samples += min(overwritten, length)
+
+        self._write_position = new_write_position
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """
+        Returns a read-only, zero-copy view of the samples between two absolute positions.
+        The view is only valid until the producer overwrites that region, so it should be used right away or copied.
+
+        Arguments:
+            start (int): The absolute position of the first sample. Clamped to the oldest sample that is still held by the buffer.
+            end (int): The absolute position after the last sample. Clamped to the newest sample.
+
+        Returns:
+            np.ndarray: A view of the requested samples.
+        """
+        end = min(end, self._write_position)
+        start = max(start, self.oldest_position)
+
+        if end <= start:
+            view = self._buffer[:0]
+        else:
+            offset = start % self._capacity
+            view = self._buffer[offset:offset + (end - start)]
+
+        view.flags.writeable = False # Only the producer may write into the buffer
+        return view
+
+    def release(self, position: int) -> None:
+        """
+        Marks all samples before the position as consumed, so the producer may overwrite them without reporting an overrun.
+
+        Arguments:
+            position (int): The absolute position up to which samples are no longer needed.
+        """
+        self._read_position = max(self._read_position, min(position, self._write_position))
+
+class AudioChunkQueue:
+    def __init__(self, maxsize: int = 8, overflow_policy: Literal["drop_oldest", "merge"] = "merge") -> None:
+        """
+        A bounded, blocking queue of audio chunks. A chunk is the range of absolute ring buffer positions (start, end) it covers.
+        By default putting never blocks, because a live producer is a real-time audio callback. If the consumer falls behind, the overflow policy decides what happens:
+        "drop_oldest" discards the oldest pending chunk, "merge" extends the newest pending chunk, so the consumer processes it in a single pass.
+        A dropped chunk leaves a gap between the chunks the consumer receives. The consumer is expected to skip the audio in that gap.
+        Producers that can wait (i.e. replayed audio) put with block=True instead, which waits for the consumer and never drops or merges.
+
+        Arguments:
+            maxsize (int): How many chunks can be pending at once. Defaults to 8.
+            overflow_policy (Literal["drop_oldest", "merge"]): What to do when a chunk is put into a full queue. Defaults to "merge".
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize must be greater than 0")
+        if overflow_policy not in ("drop_oldest", "merge"):
+            raise ValueError(f"Unknown overflow policy {overflow_policy}. Must be \"drop_oldest\" or \"merge\".")
+
+        self.maxsize = maxsize
+        self.overflow_policy = overflow_policy
+
+        self._chunks: deque[tuple[int, int, float]] = deque() # (start, end, when the chunk was put)
+        self._condition = Condition()
+        self._closed = False
+
+        self.last_wait = 0.0 # How many seconds the last retrieved chunk waited in the queue
+
+        self.dropped = 0 # Chunks discarded by the "drop_oldest" policy
+        self.merged = 0 # Chunks merged by the "merge" policy
+
+    def put(self, start: int, end: int, block: bool = False) -> None:
+        """
+        Adds a chunk to the queue. Chunks put after the queue was closed are ignored.
+
+        Arguments:
+            start (int): The absolute position where the chunk begins.
+            end (int): The absolute position where the chunk ends.
+            block (bool): Whether to wait until the consumer has made room instead of applying the overflow policy. Defaults to False.
+        """
+        with self._condition:
+            if block:
+                self._condition.wait_for(lambda: len(self._chunks) < self.maxsize or self._closed)
+
+            if self._closed:
+                return
+
+            if len(self._chunks) >= self.maxsize:
+                if self.overflow_policy == "merge":
+                    newest_start, _, put_time = self._chunks.pop()
+                    self._chunks.append((newest_start, end, put_time)) # The merged chunk has been waiting since its first part was put
+                    self.merged += 1
+                    self._condition.notify()
+                    return
+
+                self._chunks.popleft()
+                self.dropped += 1
+
+            self._chunks.append((start, end, time.perf_counter()))
+            self._condition.notify()
+
+    def get(self, timeout: float | None = None) -> tuple[int, int] | None:
+        """
+        Waits for the next chunk without using CPU time.
+
+        Arguments:
+            timeout (float | None): How many seconds to wait at most. Waits forever if None. Defaults to None.
+
+        Returns:
+            tuple[int, int] | None: The oldest pending chunk. None if the queue was closed and is empty, or the timeout expired.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._chunks) > 0 or self._closed, timeout=timeout)
+
+            if len(self._chunks) == 0:
+                return None
+
+            start, end, put_time = self._chunks.popleft()
+            self.last_wait = time.perf_counter() - put_time
+            self._condition.notify_all() # Wakes up a producer that waits for room
+
+            return start, end
+
+    def close(self, discard_pending: bool = False) -> None:
+        """
+        Closes the queue and wakes up the consumer. Pending chunks can still be retrieved, unless they are discarded.
+
+        Arguments:
+            discard_pending (bool): Whether to discard the chunks that have not been retrieved yet. Defaults to False.
+        """
+        with self._condition:
+            self._closed = True
+            if discard_pending:
+                self._chunks.clear()
+            self._condition.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._chunks)
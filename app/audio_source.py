@@ -0,0 +1,298 @@
+"""
+Description: Provides the audio sources the STT system can record from. Besides the microphone, audio can be replayed from files or numpy arrays,
+which allows running and benchmarking the STT pipeline on machines without sound hardware.
+"""
+
+from pathlib import Path
+from math import gcd
+from threading import Thread, Event
+from typing import Callable, Generator, Iterable
+import time
+
+import numpy as np
+import soundfile as sf
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+
+from Nova2.app.interfaces import AudioSourceBase
+
+class StreamingResampler:
+    def __init__(self, source_rate: int, target_rate: int) -> None:
+        """
+        Resamples a stream of audio chunk by chunk with the same result as resampling the whole signal at once.
+        Every chunk is resampled together with some surrounding audio, so the filter sees the real signal at the chunk boundaries instead of zeros.
+        The output therefore lags behind the input by a few milliseconds. Call flush() after the last chunk to get the rest.
+
+        Arguments:
+            source_rate (int): The sample rate of the input.
+            target_rate (int): The sample rate of the output.
+        """
+        divisor = gcd(source_rate, target_rate)
+        self.up = target_rate // divisor
+        self.down = source_rate // divisor
+
+        # resample_poly uses a filter with 10 * max(up, down) taps on each side at the upsampled rate. The context covers them at the input rate
+        # and is a multiple of "down", so every chunk starts on an input sample that lines up with an output sample
+        half_length = -(-10 * max(self.up, self.down) // self.up) + 1
+        self._context = -(-half_length // self.down) * self.down
+
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0 # Absolute input position of the first sample in the buffer
+        self._emitted = 0 # Absolute input position up to which the output has been returned. Always a multiple of "down"
+
+    def process(self, data: np.ndarray) -> np.ndarray:
+        """
+        Adds the next chunk of the stream.
+
+        Returns:
+            np.ndarray: The resampled audio that is final. May be empty.
+        """
+        if self.up == self.down:
+            return data
+
+        self._buffer = np.concatenate((self._buffer, data))
+        buffer_end = self._buffer_start + len(self._buffer)
+
+        # Only output that has enough audio after it to be final
+        limit = (buffer_end - self._context) // self.down * self.down
+        if limit <= self._emitted:
+            return np.zeros(0, dtype=np.float32)
+
+        output = self._resample(limit + self._context, self._emitted, limit)
+
+        # Keep the audio the next chunk needs as context
+        keep_from = max(0, limit - self._context)
+        self._buffer = self._buffer[keep_from - self._buffer_start:]
+        self._buffer_start = keep_from
+        self._emitted = limit
+
+        return output
+
+    def flush(self) -> np.ndarray:
+        """
+        Returns the rest of the output after the stream has ended.
+        """
+        if self.up == self.down:
+            return np.zeros(0, dtype=np.float32)
+
+        buffer_end = self._buffer_start + len(self._buffer)
+        output = self._resample(buffer_end, self._emitted, None)
+
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = buffer_end
+        self._emitted = buffer_end
+
+        return output
+
+    def _resample(self, end: int, output_start: int, output_end: int | None) -> np.ndarray:
+        """
+        Resamples the buffered input up to the end position and returns the output between two input positions.
+        """
+        resampled = resample_poly(self._buffer[:end - self._buffer_start], self.up, self.down)
+
+        first = (output_start - self._buffer_start) * self.up // self.down
+        last = None if output_end is None else (output_end - self._buffer_start) * self.up // self.down
+
+        return resampled[first:last].astype(np.float32)
+
+def read_audio_file(path: str | Path, chunk_seconds: float = 1.0, sample_rate: int = 16000) -> Generator[np.ndarray, None, None]:
+    """
+    Streams an audio file from the disk in chunks of mono float32 audio.
+    WAV files are memory-mapped, all other formats supported by libsndfile (i.e. FLAC) are read block by block.
+
+    Arguments:
+        path (str | Path): The audio file to read.
+        chunk_seconds (float): The length of each chunk in seconds. Defaults to 1.0.
+        sample_rate (int): The sample rate the audio is resampled to. Defaults to 16000.
+
+    Returns:
+        Generator[np.ndarray]: Yields the chunks in order.
+    """
+    path = Path(path)
+
+    if not path.exists():
+        raise FileNotFoundError(f"Audio file {path} does not exist.")
+
+    def convert(data: np.ndarray) -> np.ndarray:
+        # Normalize integer PCM to [-1, 1]
+        if data.dtype == np.uint8:
+            data = (data.astype(np.float32) - 128) / 128
+        elif np.issubdtype(data.dtype, np.integer):
+            data = data.astype(np.float32) / np.iinfo(data.dtype).max
+        else:
+            data = data.astype(np.float32, copy=False)
+
+        if data.ndim > 1:
+            data = data.mean(axis=1)
+
+        return data
+
+    blocks = None
+    file_sample_rate = sample_rate
+
+    if path.suffix.lower() == ".wav":
+        try:
+            file_sample_rate, data = wavfile.read(path, mmap=True)
+            chunk_length = max(1, int(file_sample_rate * chunk_seconds))
+            blocks = (data[i:i + chunk_length] for i in range(0, len(data), chunk_length))
+        except ValueError:
+            pass # Formats that can not be memory-mapped (i.e. 24 bit PCM) are read by libsndfile instead
+
+    if blocks is None:
+        file_sample_rate = sf.info(str(path)).samplerate
+        blocks = sf.blocks(str(path), blocksize=max(1, int(file_sample_rate * chunk_seconds)), dtype="float32", always_2d=True)
+
+    if file_sample_rate == sample_rate:
+        for block in blocks:
+            yield convert(block)
+        return
+
+    # The resampler keeps its state across the blocks, so there are no artifacts at the block boundaries
+    resampler = StreamingResampler(source_rate=file_sample_rate, target_rate=sample_rate)
+
+    for block in blocks:
+        data = resampler.process(convert(block))
+        if len(data) > 0:
+            yield data
+
+    data = resampler.flush()
+    if len(data) > 0:
+        yield data
+
+class MicrophoneSource(AudioSourceBase):
+    def __init__(self, device_index: int = -1) -> None:
+        """
+        Records audio from a microphone via sounddevice.
+
+        Arguments:
+            device_index (int): The index of the microphone to use. Defaults to the default microphone.
+        """
+        self.device_index = device_index
+        self._stream = None
+
+    def start(self, callback: Callable[[np.ndarray], None], sample_rate: int, block_size: int) -> None:
+        import sounddevice as sd # Only required when a microphone is actually used
+
+        device = self.device_index
+        if device == -1:
+            device = sd.default.device[0] # type: ignore
+
+        def stream_callback(indata, frames, time_info, status):
+            callback(indata)
+
+        self._stream = sd.InputStream(callback=stream_callback, dtype=np.float32, channels=1, samplerate=sample_rate, blocksize=block_size, device=device)
+        self._stream.start()
+
+    def stop(self) -> None:
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    @property
+    def finished(self) -> bool:
+        return False
+
+class ReplaySource(AudioSourceBase):
+    def __init__(self, speed: float = 1.0) -> None:
+        """
+        Base class for sources that replay prerecorded audio on a background thread, acting like a virtual microphone.
+
+        Arguments:
+            speed (float): How fast the audio is replayed. 1.0 is real-time, 2.0 twice as fast. 0 replays as fast as possible.
+        """
+        if speed < 0:
+            raise ValueError("speed must not be negative")
+
+        self.speed = speed
+        self.delivered_samples = 0
+
+        self._thread: Thread = None # type: ignore
+        self._stop_event = Event()
+        self._finished = Event()
+
+    def _blocks(self, sample_rate: int, block_size: int) -> Iterable[np.ndarray]:
+        """
+        Yields the audio to replay in blocks of mono float32 audio.
+        """
+        raise NotImplementedError
+
+    def start(self, callback: Callable[[np.ndarray], None], sample_rate: int, block_size: int) -> None:
+        self._stop_event.clear()
+        self._finished.clear()
+        self.delivered_samples = 0
+
+        self._thread = Thread(target=self._replay, args=(callback, sample_rate, block_size), daemon=True)
+        self._thread.start()
+
+    def _replay(self, callback: Callable[[np.ndarray], None], sample_rate: int, block_size: int) -> None:
+        start_time = time.perf_counter()
+
+        try:
+            for block in self._blocks(sample_rate, block_size):
+                if self._stop_event.is_set():
+                    break
+
+                # Wait until the block would have been recorded by a real microphone
+                if self.speed > 0:
+                    due = start_time + (self.delivered_samples + len(block)) / sample_rate / self.speed
+                    delay = due - time.perf_counter()
+                    if delay > 0 and self._stop_event.wait(delay):
+                        break
+
+                callback(block)
+                self.delivered_samples += len(block)
+        finally:
+            self._finished.set()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    @property
+    def realtime(self) -> bool:
+        return False
+
+class FileReplaySource(ReplaySource):
+    def __init__(self, path: str | Path, speed: float = 1.0) -> None:
+        """
+        Replays a WAV or FLAC file as if it was recorded by a microphone.
+
+        Arguments:
+            path (str | Path): The audio file to replay.
+            speed (float): How fast the audio is replayed. 1.0 is real-time, 2.0 twice as fast. 0 replays as fast as possible. Defaults to 1.0.
+        """
+        super().__init__(speed=speed)
+        self.path = Path(path)
+
+        if not self.path.exists():
+            raise FileNotFoundError(f"Audio file {self.path} does not exist.")
+
+    def _blocks(self, sample_rate: int, block_size: int) -> Iterable[np.ndarray]:
+        return read_audio_file(path=self.path, chunk_seconds=block_size / sample_rate, sample_rate=sample_rate)
+
+class ArraySource(ReplaySource):
+    def __init__(self, audio: np.ndarray | Iterable[np.ndarray], speed: float = 1.0) -> None:
+        """
+        Replays audio from a numpy array or from a generator that yields numpy arrays.
+        The audio must be mono float32 at the sample rate of the STT system (16kHz).
+
+        Arguments:
+            audio (np.ndarray | Iterable[np.ndarray]): The audio to replay.
+            speed (float): How fast the audio is replayed. 1.0 is real-time, 2.0 twice as fast. 0 replays as fast as possible. Defaults to 1.0.
+        """
+        super().__init__(speed=speed)
+        self.audio = audio
+
+    def _blocks(self, sample_rate: int, block_size: int) -> Iterable[np.ndarray]:
+        arrays = [self.audio] if isinstance(self.audio, np.ndarray) else self.audio
+
+        for array in arrays:
+            array = np.asarray(array, dtype=np.float32).reshape(-1)
+            for i in range(0, len(array), block_size):
+                yield array[i:i + block_size]
@@ -28,6 +28,9 @@ class ContextSource(ContextSourceBase):
 @dataclass
 class ContextSource_Voice(ContextSource):
     speaker: str
+    utterance_id: str = "" # Identifies all revisions of the same utterance. Empty for datapoints that are never revised
+    revision: int = 0 # Later revisions replace earlier ones
+    final: bool = True # Whether this is the last revision of the utterance. Partial revisions are speculative and may still change
 
 class ContextSource_User(ContextSource):
     pass
@@ -97,6 +100,9 @@ class Context(ContextBase):
                         content=datapoint.content # Assistant message does not need a timestamp
                 ))
             elif type(datapoint.source) == ContextSource_Voice:
+                if not datapoint.source.final:
+                    continue # Partial revisions are speculative, the LLM only sees finished sentences
+
                 messages.append(
                     Message(
                         author="user",
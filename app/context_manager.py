@@ -75,11 +75,23 @@ class ContextManager(Singleton):
     def add_to_context(self, datapoint: ContextDatapoint) -> None:
         """
         Adds content to the context.json file.
+        If the datapoint is a revision of an utterance that is already in the context, the previous revision is replaced instead.
 
         Arguments:
             datapoint (ContextDatapoint): The datapoint that will be added to the context.
         """
-        self.context_data.append(datapoint.to_dict())
+        data = datapoint.to_dict()
+
+        # Revisions of an utterance replace the previous revision in place
+        if type(datapoint.source) == ContextSource_Voice and datapoint.source.utterance_id != "":
+            for i in range(len(self.context_data) - 1, -1, -1):
+                metadata = self.context_data[i]["source"].get("metadata", {})
+                if metadata.get("utterance_id") == datapoint.source.utterance_id:
+                    if metadata.get("revision", 0) <= datapoint.source.revision:
+                        self.context_data[i] = data
+                    return
+
+        self.context_data.append(data)
 
         if self.ctx_limit > 0:
             self.context_data = self.context_data[-self.ctx_limit:]
@@ -237,6 +249,9 @@ class ContextManager(Singleton):
                     dp = ContextDatapoint(
                         source=ContextSource_Voice(
                             speaker=new_name,
+                            utterance_id=datapoint.source.utterance_id,
+                            revision=datapoint.source.revision,
+                            final=datapoint.source.final
                         ),
                         content=datapoint.content
                     )
@@ -3,11 +3,20 @@ Description: Manages the databases and provides a simple interface
 """
 
 from typing import Tuple
+from collections import OrderedDict
 import uuid
+import json
+import os
+import hashlib
 from pathlib import Path
+from threading import Lock, Thread
+import time
 import warnings
+import zipfile
+import struct
 import re
 
+import numpy as np
 import torch
 from transformers import AutoModel
 from qdrant_client import QdrantClient
@@ -16,51 +25,312 @@ from qdrant_client.http import models
 from sqlalchemy.ext.declarative import declarative_base
 
 from Nova2.app.helpers import suppress_output, Singleton
+from Nova2.app.tts_data import TTS_VOICE_PATH
 
 base = declarative_base()
 
+class IdSequence:
+    def __init__(self, path: Path, initial_value: int = 0) -> None:
+        """
+        Hands out monotonically increasing integer IDs and persists the next free ID, so IDs are never reused, even after a restart.
+        Thread-safe. IDs can be reserved in blocks, so a batch of inserts only needs a single allocation.
+
+        Arguments:
+            path (Path): The file the next free ID is persisted to.
+            initial_value (int): The first ID if the file does not exist yet. Defaults to 0.
+        """
+        self._path = path
+        self._lock = Lock()
+
+        if path.exists():
+            self._next_id = json.loads(path.read_text())["next_id"]
+        else:
+            self._next_id = initial_value
+            self._save()
+
+    def reserve(self, count: int = 1) -> range:
+        """
+        Reserves a block of consecutive IDs.
+
+        Arguments:
+            count (int): How many IDs to reserve. Defaults to 1.
+
+        Returns:
+            range: The reserved IDs.
+        """
+        if count < 0:
+            raise ValueError("count must not be negative")
+
+        with self._lock:
+            ids = range(self._next_id, self._next_id + count)
+            self._next_id += count
+            self._save()
+
+        return ids
+
+    @property
+    def next_id(self) -> int:
+        return self._next_id
+
+    def _save(self) -> None:
+        # Write to a temporary file first, so a crash can not leave a corrupted sequence behind
+        temporary_path = self._path.with_suffix(".tmp")
+        temporary_path.write_text(json.dumps({"next_id": self._next_id}))
+        os.replace(temporary_path, self._path)
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024) -> None:
+        """
+        A least recently used cache for embeddings, keyed by a hash of the text they were computed from. Thread-safe.
+        The least recently used embeddings are evicted once either the entry or the memory limit is exceeded.
+
+        Arguments:
+            max_entries (int): How many embeddings are cached at most. Defaults to 1024.
+            max_bytes (int): How much memory the cached embeddings may use at most. Defaults to 64 MiB.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = Lock()
+        self._entries: OrderedDict[str, torch.Tensor] = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str) -> torch.Tensor | None:
+        key = self._key(text)
+
+        with self._lock:
+            embedding = self._entries.get(key)
+
+            if embedding is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return embedding
+
+    def put(self, text: str, embedding: torch.Tensor) -> None:
+        key = self._key(text)
+        size = embedding.element_size() * embedding.nelement()
+
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._size(self._entries.pop(key))
+
+            self._entries[key] = embedding
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """
+        The hits, misses, hit rate, number of cached embeddings and their memory usage in bytes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _size(embedding: torch.Tensor) -> int:
+        return embedding.element_size() * embedding.nelement()
+
+class LazyEmbeddingModel:
+    def __init__(self, model_name: str, device: str | None = None, half_precision: bool = False, idle_timeout: float = 0.0) -> None:
+        """
+        Loads a huggingface embedding model on first use instead of on creation. Thread-safe.
+        Can unload the model again after it has not been used for a while to free its memory.
+
+        Arguments:
+            model_name (str): The huggingface repository of the model.
+            device (str | None): The device to run the model on. None uses cuda if it is available and the CPU otherwise. Defaults to None.
+            half_precision (bool): Whether to run the model in float16. Only applies to cuda devices. Defaults to False.
+            idle_timeout (float): After how many seconds without use the model is unloaded. 0 keeps it loaded. Defaults to 0.
+        """
+        self.model_name = model_name
+        self.device = device
+        self.half_precision = half_precision
+        self.idle_timeout = idle_timeout
+
+        self._model = None
+        self._lock = Lock()
+        self._last_used = 0.0
+        self._unload_thread: Thread | None = None # Runs while the model is loaded and an idle timeout is set
+
+    def encode(self, texts: list[str], **kwargs) -> np.ndarray:
+        """
+        Runs the encode method of the model. Loads the model first if needed.
+        """
+        with self._lock: # Also prevents the model from being unloaded while it is in use
+            if self._model is None:
+                self._load()
+
+            embeddings = self._model.encode(texts, **kwargs) # type: ignore
+            self._last_used = time.monotonic()
+
+            if self.idle_timeout > 0 and self._unload_thread is None:
+                self._unload_thread = Thread(target=self._unload_when_idle, daemon=True)
+                self._unload_thread.start()
+
+        return embeddings
+
+    def unload(self) -> None:
+        """
+        Frees the model. It is loaded again on the next use.
+        """
+        with self._lock:
+            self._unload()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def _load(self) -> None:
+        device = self.device
+        if device is None or (device.startswith("cuda") and not torch.cuda.is_available()):
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        with warnings.catch_warnings(action="ignore"): # Blocks a deprecation warning
+            with suppress_output(): # Don't show model downloads
+                model = AutoModel.from_pretrained(self.model_name, trust_remote_code=True).to(device)
+
+        if self.half_precision and device.startswith("cuda"): # Most float16 operations are slow or unsupported on the CPU
+            model = model.half()
+
+        self._model = model.eval()
+
+    def _unload(self) -> None:
+        if self._model is None:
+            return
+
+        self._model = None
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _unload_when_idle(self) -> None:
+        # Sleeps until the model could have been idle for the timeout and checks again, so using the model does not need to reschedule anything
+        while True:
+            with self._lock:
+                if self._model is None or self.idle_timeout <= 0:
+                    self._unload_thread = None
+                    return
+
+                remaining = self._last_used + self.idle_timeout - time.monotonic()
+                if remaining <= 0:
+                    self._unload()
+                    self._unload_thread = None
+                    return
+
+            time.sleep(remaining)
+
 # RAG hat Swag. LG an Valentin Weyer.
 class MemoryEmbeddingDatabaseManager(Singleton):
     def __init__(self):
         """
         This class is responsible for managing the memory database which stores memories as text-embeddings.
         It also provides a semantic search system used for retrieval augmented generation.
+        The embeddings of search queries are cached, so repeated searches for the same text do not run the model again.
+        The text embedding model is only loaded once it is needed.
         """
+        if hasattr(self, "_qdrant_client"): # The singleton is already set up. Keep the open database and the cache
+            return
+
         self._qdrant_client: QdrantClient = None # type: ignore
-        self.text_embedding_model = None
+        self.text_embedding_model = LazyEmbeddingModel("jinaai/jina-embeddings-v3")
+        self._ids: IdSequence = None # type: ignore
+        self.query_cache = EmbeddingCache()
         self._prepare_database()
 
+    def configure_embedding_model(self, device: str | None = None, half_precision: bool = False, idle_timeout: float = 0.0) -> None:
+        """
+        Configures how the text embedding model is run. Unloads the model if it is currently loaded, the new configuration applies on its next use.
+        Cached query embeddings are discarded, because they were generated with the previous configuration.
+
+        Arguments:
+            device (str | None): The device to run the model on. None uses cuda if it is available and the CPU otherwise. Defaults to None.
+            half_precision (bool): Whether to run the model in float16 on cuda devices. Defaults to False.
+            idle_timeout (float): After how many seconds without use the model is unloaded. 0 keeps it loaded. Defaults to 0.
+        """
+        self.text_embedding_model.unload()
+
+        self.text_embedding_model.device = device
+        self.text_embedding_model.half_precision = half_precision
+        self.text_embedding_model.idle_timeout = idle_timeout
+
+        self.query_cache.clear()
+
     def create_new_entry(self, text: str) -> None:
         """
         Write new entry to the database. The input is chunked into sentences and each sentence is converted into
-        a text embedding.
+        a text embedding. All sentences are embedded, checked for duplicates and written to the database at once.
 
         Arguments:
             text (str): The text that should be stored to the database.
         """
-        split_text = re.split('[.!?]', text) # Split into sentences before storing
-        
-        for text in split_text:
-            self._save_embedding_to_db(text)
+        split_text = [sentence.strip() for sentence in re.split('[.!?]', text)] # Split into sentences before storing
+        split_text = [sentence for sentence in split_text if sentence != ""]
+
+        if len(split_text) == 0:
+            return
+
+        self._save_embeddings_to_db(split_text)
 
-    def _save_embedding_to_db(self, text: str) -> None:
-        embedding = self._compute_embedding(text)
+    def _save_embeddings_to_db(self, texts: list[str], similarity_threshold: float = 0.8) -> None:
+        embeddings = self._compute_embeddings(texts).cpu().numpy()
 
         #Prevent duplicate entries
-        if self._is_embedding_in_database(self._torch_tensor_to_float_list(embedding)):
-            warnings.warn("Similar or exact embedding already exists in memory embedding database.")
+        duplicates = self._find_embeddings_in_database(embeddings, similarity_threshold=similarity_threshold)
+
+        # Sentences of the same text can also duplicate each other
+        normalized = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        similarities = normalized @ normalized.T
+
+        kept = []
+        for i in range(len(texts)):
+            if duplicates[i] or any(similarities[i, j] >= similarity_threshold for j in kept):
+                warnings.warn("Similar or exact embedding already exists in memory embedding database.")
+                continue
+            kept.append(i)
+
+        if len(kept) == 0:
             return
 
-        id = self._qdrant_client.get_collection("memory_embeddings").points_count
+        ids = self._ids.reserve(len(kept))
 
         self._qdrant_client.upsert(
             collection_name="memory_embeddings",
             points=[
                 PointStruct(
-                    id=id, # type: ignore
-                    vector=embedding, # type: ignore
-                    payload={"text": text}
+                    id=id,
+                    vector=embeddings[i].tolist(),
+                    payload={"text": texts[i]}
                 )
+                for id, i in zip(ids, kept)
             ]
         )
     
@@ -82,7 +352,12 @@ class MemoryEmbeddingDatabaseManager(Singleton):
         Returns:
             list[list[str]]. Each string list is a result with the entries around the result in chronological order. Returns None if no results surpassed the cosine similarity threshold.
         """
-        query_embedding = self._torch_tensor_to_float_list(self._compute_embedding(text=text))
+        embedding = self.query_cache.get(text)
+        if embedding is None:
+            embedding = self._compute_embedding(text=text)
+            self.query_cache.put(text, embedding)
+
+        query_embedding = self._torch_tensor_to_float_list(embedding)
 
         search_results = self._qdrant_client.query_points(
             collection_name="memory_embeddings",
@@ -103,57 +378,62 @@ class MemoryEmbeddingDatabaseManager(Singleton):
         if search_area <= 0:
             return [[result.payload["text"]] for result in results] # type: ignore
         
-        # Loop through all results and do area queries
-        return_list = []
-
-        for result in results:
-            return_list.append(self._query_area(result.id, search_area)) # type: ignore
-
-        return return_list
+        return self._query_areas([result.id for result in results], search_area) # type: ignore
 
-    def _query_area(self, center_id: int, size: int) -> list[str]:
+    def _query_areas(self, center_ids: list[int], size: int) -> list[list[str]]:
         """
-        Query entries around the specified entry to provide more context to the search result of the semantic search.
+        Query entries around the specified entries to provide more context to the results of the semantic search.
+        The entries of all areas are retrieved in a single request. Overlapping areas are only retrieved once.
 
         Arguments:
-            center_id (int): The index of the semantic search result.
-            size (int): How many earlier and later entries should be queried. The amount of returned entries is 2 * size + 1.
+            center_ids (list[int]): The indices of the semantic search results.
+            size (int): How many earlier and later entries should be queried. Each area holds up to 2 * size + 1 entries.
+                        Areas shrink at the start and the end of the database.
 
         Returns:
-            list[str]: A list of results from the database.
+            list[list[str]]: The entries of each area in chronological order.
         """
-        max_id = self._qdrant_client.get_collection("memory_embeddings").points_count - 1 # type: ignore
+        max_id = self._ids.next_id - 1 # IDs are handed out in chronological order, so no ID above this exists
 
-        limit_down = size
-        limit_up = size
+        areas = [(max(0, center_id - size), min(max_id, center_id + size)) for center_id in center_ids]
 
-        start_id = center_id - size
+        # Merge overlapping and adjacent areas, so every entry is only requested once
+        merged: list[list[int]] = []
+        for start, end in sorted(areas):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
 
-        # Ensure the start is inside the bounds of the db
-        if (center_id - size < 0):
-            start_id = 0
-            limit_down = 0 # Ensure the area shrinks if the query starts at 0 instead of being offset upwards
-        elif (start_id + limit_up > max_id):
-            start_id = max_id
-            limit_up = 0 # Ensure the area shrinks if the query is partially greater than the collection size
-
-        search_results = self._qdrant_client.query_points(
+        points = self._qdrant_client.retrieve(
             collection_name="memory_embeddings",
-            limit=limit_down + limit_up + 1,
-            offset=start_id
+            ids=[id for start, end in merged for id in range(start, end + 1)],
+            with_payload=True,
+            with_vectors=False
         )
 
-        return [result.payload["text"] for result in search_results.points] # type: ignore
+        texts: dict[int, str] = {int(point.id): point.payload["text"] for point in points} # type: ignore
+
+        # Deleted entries leave gaps in the IDs and are skipped
+        return [[texts[id] for id in range(start, end + 1) if id in texts] for start, end in areas]
     
-    def _is_embedding_in_database(self, embedding: list[float], similarity_threshold: float = 0.8) -> bool:
-        results = self._qdrant_client.query_points(
+    def _find_embeddings_in_database(self, embeddings: np.ndarray, similarity_threshold: float = 0.8) -> list[bool]:
+        """
+        Checks for each embedding whether a similar embedding is already stored. All embeddings are checked in a single request.
+        """
+        results = self._qdrant_client.query_batch_points(
             collection_name="memory_embeddings",
-            query=embedding,
-            limit=1,
-            score_threshold=similarity_threshold
+            requests=[
+                models.QueryRequest(
+                    query=embedding.tolist(),
+                    limit=1,
+                    score_threshold=similarity_threshold
+                )
+                for embedding in embeddings
+            ]
         )
 
-        return len(results.points) > 0
+        return [len(result.points) > 0 for result in results]
 
     def _compute_embedding(self, text: str) -> torch.Tensor:
         """
@@ -165,33 +445,246 @@ class MemoryEmbeddingDatabaseManager(Singleton):
         Returns:
             torch.FloatTensor: The computed embedding.
         """
-        embedding = self.text_embedding_model.encode(text, task="text-matching") # type: ignore
+        return self._compute_embeddings([text]).squeeze(0)
+
+    def _compute_embeddings(self, texts: list[str]) -> torch.Tensor:
+        """
+        Computes the embeddings of multiple texts in a single pass.
+
+        Arguments:
+            texts (list[str]): The texts that will be converted into embeddings.
+
+        Returns:
+            torch.FloatTensor: The computed embeddings with shape (len(texts), 1024).
+        """
+        embeddings = self.text_embedding_model.encode(texts, task="text-matching")
 
-        return torch.from_numpy(embedding).squeeze()
+        return torch.from_numpy(np.asarray(embeddings, dtype=np.float32)).reshape(len(texts), -1) # Half precision models return float16
 
     def _prepare_database(self) -> None:
         db_location = Path(__file__).parent.parent / "db" / "db_memory_embeddings"
 
         self._qdrant_client = QdrantClient(path=db_location) # type: ignore
 
-        if not self.text_embedding_model:
-            with warnings.catch_warnings(action="ignore"): # Blocks a deprecation warning
-                with suppress_output(): # Don't show model downloads
-                    self.text_embedding_model = AutoModel.from_pretrained("jinaai/jina-embeddings-v3", trust_remote_code=True).to("cuda")
-
         if not self._qdrant_client.collection_exists("memory_embeddings"):
             self._qdrant_client.create_collection(collection_name="memory_embeddings", vectors_config=VectorParams(size=1024, distance=Distance.COSINE))
 
+        sequence_path = Path(__file__).parent.parent / "db" / "memory_embedding_ids.json"
+        initial_id = 0 if sequence_path.exists() else self._find_next_free_id()
+        self._ids = IdSequence(path=sequence_path, initial_value=initial_id)
+
+    def _find_next_free_id(self) -> int:
+        """
+        Finds the ID after the highest ID in use. Only needed once for databases that were created before IDs were persisted.
+        """
+        next_id = 0
+
+        offset = None
+        while True:
+            points, offset = self._qdrant_client.scroll(
+                collection_name="memory_embeddings",
+                limit=1024,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+
+            for point in points:
+                next_id = max(next_id, int(point.id) + 1)
+
+            if offset is None:
+                break
+
+        return next_id
+
     def _torch_tensor_to_float_list(self, embedding: torch.Tensor) -> list[float]:
         return embedding.squeeze().cpu().numpy().tolist()
 
+class VoiceEmbeddingIndex:
+    def __init__(self, dimensions: int = 512, initial_capacity: int = 64) -> None:
+        """
+        Holds all voice embeddings as rows of a normalized numpy matrix, so the closest voice is found with a single matrix-vector product.
+        Thread-safe. Searches work on a snapshot and never wait for writes to finish.
+
+        Arguments:
+            dimensions (int): The size of the embeddings. Defaults to 512.
+            initial_capacity (int): How many embeddings fit before the matrix has to grow. Defaults to 64.
+        """
+        self.dimensions = dimensions
+
+        self._lock = Lock()
+        self._matrix = np.zeros((max(1, initial_capacity), dimensions), dtype=np.float32)
+        self._ids: list[str] = []
+        self._names: list[str] = []
+        self._ids_by_name: dict[str, list[str]] = {} # Several voices can share a name
+        self._positions: dict[str, int] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, id: str) -> bool:
+        return id in self._positions
+
+    def add(self, id: str, name: str, embedding: np.ndarray) -> None:
+        """
+        Adds an embedding to the index. Replaces the embedding and name if the ID is already in the index.
+
+        Arguments:
+            id (str): The ID of the voice in the database.
+            name (str): The name of the voice.
+            embedding (np.ndarray): The embedding. Does not need to be normalized.
+        """
+        vector = self._normalize(embedding)
+
+        if id in self._positions:
+            with self._lock:
+                self._matrix[self._positions[id]] = vector
+            self.rename(id, name)
+            return
+
+        with self._lock:
+            if self._count == len(self._matrix):
+                # Grow by doubling, so adding voices stays cheap. Searches that still use the old matrix are not affected
+                matrix = np.zeros((len(self._matrix) * 2, self.dimensions), dtype=np.float32)
+                matrix[:self._count] = self._matrix[:self._count]
+                self._matrix = matrix
+
+            self._matrix[self._count] = vector
+            self._ids.append(id)
+            self._names.append(name)
+            self._ids_by_name.setdefault(name, []).append(id)
+            self._positions[id] = self._count
+            self._count += 1
+
+    def search(self, embedding: np.ndarray) -> Tuple[str, str, float] | None:
+        """
+        Finds the closest voice by cosine similarity.
+
+        Arguments:
+            embedding (np.ndarray): The embedding to search for.
+
+        Returns:
+            Tuple[str, str, float] | None: The ID, the name and the cosine similarity of the closest voice, or None if the index is empty.
+        """
+        with self._lock:
+            count = self._count
+            matrix = self._matrix
+            ids = self._ids
+            names = self._names
+
+        if count == 0:
+            return None
+
+        scores = matrix[:count] @ self._normalize(embedding)
+        best = int(np.argmax(scores))
+
+        return ids[best], names[best], float(scores[best])
+
+    def get_id(self, name: str) -> str | None:
+        """
+        Looks up the ID of the voice with the given name. If several voices share the name, the one that was added first is returned.
+        """
+        ids = self._ids_by_name.get(name)
+        return ids[0] if ids else None
+
+    def rename(self, id: str, name: str) -> None:
+        with self._lock:
+            position = self._positions[id]
+
+            self._unlink_name(self._names[position], id)
+            self._ids_by_name.setdefault(name, []).append(id)
+
+            names = list(self._names) # Copy on write, searches may still use the old list
+            names[position] = name
+            self._names = names
+
+    def remove(self, id: str) -> None:
+        """
+        Removes an embedding from the index. Does nothing if the ID is not in the index.
+        """
+        with self._lock:
+            position = self._positions.pop(id, None)
+            if position is None:
+                return
+
+            self._unlink_name(self._names[position], id)
+
+            # The last row takes the place of the removed one. Copy on write, searches may still use the old matrix and lists
+            last = self._count - 1
+            matrix = self._matrix.copy()
+            ids = list(self._ids)
+            names = list(self._names)
+
+            if position != last:
+                matrix[position] = matrix[last]
+                ids[position] = ids[last]
+                names[position] = names[last]
+                self._positions[ids[position]] = position
+
+            matrix[last] = 0
+            self._matrix = matrix
+            self._ids = ids[:last]
+            self._names = names[:last]
+            self._count = last
+
+    def _unlink_name(self, name: str, id: str) -> None:
+        ids = self._ids_by_name.get(name, [])
+        if id in ids:
+            ids.remove(id)
+        if len(ids) == 0:
+            self._ids_by_name.pop(name, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._matrix = np.zeros_like(self._matrix)
+            self._ids = []
+            self._names = []
+            self._ids_by_name = {}
+            self._positions = {}
+            self._count = 0
+
+    def snapshot(self) -> Tuple[list[str], list[str], np.ndarray]:
+        """
+        Returns the IDs, the names and a copy of the normalized embeddings with shape (n, dimensions).
+        """
+        with self._lock:
+            return list(self._ids), list(self._names), self._matrix[:self._count].copy()
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._names)
+
+    def _normalize(self, embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+
+        if len(vector) != self.dimensions:
+            raise ValueError(f"Expected an embedding with {self.dimensions} dimensions, got {len(vector)}.")
+
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
 class VoiceDatabaseManager(Singleton):
-    def __init__(self) -> None:
+    def __init__(self, db_path: Path | None = None) -> None:
         """
         This class is responsible for managing the database that stores the voice embeddings generated by 'transcriptor.py'.
         It also provides a method to compare two embeddings to determine whether two voices match.
+        All embeddings are held in an in-memory index for searching. Qdrant stores them persistently and every write goes through to it.
+
+        Arguments:
+            db_path (Path | None): The folder that holds the database and the voice counters. Defaults to the 'db' folder of the project.
         """
+        if hasattr(self, "_qdrant_client"): # The singleton is already set up. Keep the open database and the index
+            return
+
         self._qdrant_client: QdrantClient = None # type: ignore
+        self._index = VoiceEmbeddingIndex(dimensions=512)
+
+        self._db_path = db_path if db_path is not None else Path(__file__).parent.parent / "db"
+        self._counter_path = self._db_path / "voice_counters.json"
+        self._tts_voice_path = TTS_VOICE_PATH
+        self._counter_lock = Lock()
+        self._next_unknown_voice = 0
+
         self._prepare_database()
     
     def create_voice(self, embedding: torch.Tensor, name: str) -> None:
@@ -202,16 +695,21 @@ class VoiceDatabaseManager(Singleton):
             embedding (torch.FloatTensor): The embedding that will be stored in the database.
             name (str): The name of the person the voice belongs to. Will be stored together with the embedding.
         """
+        id = str(uuid.uuid4())
+        vector = self._torch_tensor_to_numpy(embedding)
+
         self._qdrant_client.upsert(
             collection_name="voice_embeddings",
             points=[
                 PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=self._torch_tensor_to_float_list(embedding),
+                    id=id,
+                    vector=vector.tolist(),
                     payload={"name": name}
                 )
             ]
         )
+
+        self._index.add(id=id, name=name, embedding=vector)
     
     def create_unknown_voice(self, embedding: torch.Tensor) -> str:
         """
@@ -220,9 +718,14 @@ class VoiceDatabaseManager(Singleton):
         Arguments:
             embedding (torch.FloatTensor): The embedding that will be stored in the database.
         """
-        unknown_counter = 0
-        while self.does_voice_exist(f"UnknownVoice{unknown_counter}"): # Find an index that is not already in use
-            unknown_counter += 1
+        with self._counter_lock:
+            # The counter is persisted and only ever increases, so numbers of renamed voices are not handed out again
+            unknown_counter = self._next_unknown_voice
+            while self.does_voice_exist(f"UnknownVoice{unknown_counter}"): # Only loops if a voice was named like this manually
+                unknown_counter += 1
+
+            self._next_unknown_voice = unknown_counter + 1
+            self._save_counters()
 
         self.create_voice(embedding, f"UnknownVoice{unknown_counter}")
 
@@ -239,14 +742,10 @@ class VoiceDatabaseManager(Singleton):
         Returns:
             Tuple[str, float] | None: Either returns a tuple with the name of the voice and the confidence score or None if no voice could be found.
         """
-        search_results = self._qdrant_client.search(
-            collection_name="voice_embeddings",
-            query_vector=self._torch_tensor_to_float_list(embedding),
-            limit=1
-        )
+        result = self._index.search(self._torch_tensor_to_numpy(embedding))
 
-        if len(search_results) > 0:
-            return search_results[0].payload["name"], search_results[0].score # type: ignore
+        if result:
+            return result[1], result[2]
         else:
             return None
     
@@ -260,22 +759,7 @@ class VoiceDatabaseManager(Singleton):
         Returns:
             bool: Whether a voice with that name already exists in the database.
         """
-        filter_condition = models.Filter(
-            must=[
-                models.FieldCondition(
-                    key="name",
-                    match=models.MatchValue(value=name)
-                )
-            ]
-        )
-
-        search_result = self._qdrant_client.scroll(
-            collection_name="voice_embeddings",
-            scroll_filter=filter_condition,
-            limit=1
-        )
-
-        return len(search_result[0]) > 0
+        return self._index.get_id(name) is not None
     
     def get_voice_id(self, embedding: torch.FloatTensor) -> int | None:
         """
@@ -287,14 +771,10 @@ class VoiceDatabaseManager(Singleton):
         Returns:
             int | None: The index of the voice or None if no voice was found.
         """
-        search_results = self._qdrant_client.search(
-            collection_name="voice_embeddings",
-            query_vector=self._torch_tensor_to_float_list(embedding),
-            limit=1
-        )
+        result = self._index.search(self._torch_tensor_to_numpy(embedding))
 
-        if len(search_results) > 0:
-            return search_results[0].id # type: ignore
+        if result:
+            return result[0] # type: ignore
         else:
             return None
     
@@ -309,24 +789,10 @@ class VoiceDatabaseManager(Singleton):
         Returns:
             bool: Whether the operation was successful.
         """
-        # Find the voice ID using the old name
-        search_result = self._qdrant_client.scroll(
-            collection_name="voice_embeddings",
-            scroll_filter=models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="name",
-                        match=models.MatchValue(value=old_name)
-                    )
-                ]
-            ),
-            limit=1 
-        )
+        voice_id = self._index.get_id(old_name)
         
-        if not search_result[0]: # Return False if no voice was found.
+        if voice_id is None: # Return False if no voice was found.
             return False
-            
-        voice_id = search_result[0][0].id
         
         # Update the name
         self._qdrant_client.set_payload(
@@ -334,16 +800,243 @@ class VoiceDatabaseManager(Singleton):
             payload={"name": new_name},
             points=[voice_id]
         )
+
+        self._index.rename(voice_id, new_name)
         
         return True
 
+    def delete_voice(self, name: str) -> bool:
+        """
+        Deletes a voice from the database.
+
+        Arguments:
+            name (str): The name of the voice. If several voices share the name, the one that was created first is deleted.
+
+        Returns:
+            bool: Whether the operation was successful.
+        """
+        voice_id = self._index.get_id(name)
+
+        if voice_id is None:
+            return False
+
+        self._qdrant_client.delete(
+            collection_name="voice_embeddings",
+            points_selector=models.PointIdsList(points=[voice_id])
+        )
+
+        self._index.remove(voice_id)
+
+        return True
+
+    def export_voices(self, path: Path) -> None:
+        """
+        Exports all speaker voices and all voices of the TTS engines into a single uncompressed npz archive.
+        The archive holds float32 matrices and the names of the voices and can be memory-mapped when it is imported.
+
+        Arguments:
+            path (Path): Where the archive should be written to.
+        """
+        ids, names, embeddings = self._index.snapshot()
+
+        tts_names = sorted(file.stem for file in self._tts_voice_path.glob("*.npy")) if self._tts_voice_path.exists() else []
+        tts_embeddings = [np.load(self._tts_voice_path / f"{name}.npy").astype(np.float32) for name in tts_names]
+
+        if len(set(embedding.shape for embedding in tts_embeddings)) > 1:
+            raise Exception("Failed to export voices. The TTS voices do not share the same shape.")
+
+        with open(path, "wb") as file: # A file object prevents numpy from appending ".npz" to the path
+            np.savez(
+                file,
+                speaker_ids=np.array(ids, dtype=str),
+                speaker_names=np.array(names, dtype=str),
+                speaker_embeddings=embeddings.reshape(-1, self._index.dimensions),
+                tts_names=np.array(tts_names, dtype=str),
+                tts_embeddings=np.stack(tts_embeddings) if tts_embeddings else np.zeros((0,), dtype=np.float32)
+            )
+
+    def import_voices(self, path: Path, overwrite: bool = False, batch_size: int = 512) -> Tuple[int, int]:
+        """
+        Imports an archive created by export_voices. The speaker voices are written to the database in batches.
+
+        Arguments:
+            path (Path): The archive to import.
+            overwrite (bool): Whether voices that already exist under the same name should be replaced. If False, they are skipped. Defaults to False.
+            batch_size (int): How many voices are written to the database at once. Defaults to 512.
+
+        Returns:
+            Tuple[int, int]: How many speaker voices and how many TTS voices were imported.
+        """
+        archive = _load_npz_mmap(Path(path))
+
+        ids = archive["speaker_ids"]
+        names = archive["speaker_names"]
+        embeddings = archive["speaker_embeddings"]
+
+        # The names become file names. Check all of them before anything is written
+        voice_folder = self._tts_voice_path.resolve()
+        for name in archive["tts_names"]:
+            name = str(name)
+            if name in ("", ".", "..") or "/" in name or "\\" in name or (voice_folder / f"{name}.npy").resolve().parent != voice_folder:
+                raise Exception(f"Failed to import voices. The archive contains an invalid TTS voice name: {name!r}")
+
+        # Pick the voices to import. A replaced voice keeps its ID, so references to it stay valid
+        selected = []
+        taken_ids = set()
+        for i, name in enumerate(names):
+            name = str(name)
+            existing_id = self._index.get_id(name)
+
+            if existing_id is not None:
+                if overwrite:
+                    selected.append((existing_id, name, i))
+                continue
+
+            # The ID may already belong to another voice, i.e. one that was renamed after the export
+            id = str(ids[i])
+            if id in self._index or id in taken_ids:
+                id = str(uuid.uuid4())
+
+            taken_ids.add(id)
+            selected.append((id, name, i))
+
+        for start in range(0, len(selected), batch_size):
+            batch = selected[start:start + batch_size]
+            vectors = np.asarray(embeddings[[i for _, _, i in batch]], dtype=np.float32)
+
+            self._qdrant_client.upsert(
+                collection_name="voice_embeddings",
+                points=models.Batch(
+                    ids=[id for id, _, _ in batch],
+                    vectors=vectors.tolist(),
+                    payloads=[{"name": name} for _, name, _ in batch]
+                )
+            )
+
+            for (id, name, _), vector in zip(batch, vectors):
+                self._index.add(id=id, name=name, embedding=vector)
+
+        # Imported unknown voices must not be handed out again
+        with self._counter_lock:
+            self._load_counters()
+            self._save_counters()
+
+        tts_imported = 0
+        if len(archive["tts_names"]) > 0:
+            self._tts_voice_path.mkdir(parents=True, exist_ok=True)
+
+        for name, embedding in zip(archive["tts_names"], archive["tts_embeddings"]):
+            target = self._tts_voice_path / f"{name}.npy"
+
+            if target.exists() and not overwrite:
+                continue
+
+            np.save(target, np.asarray(embedding, dtype=np.float32))
+            tts_imported += 1
+
+        return len(selected), tts_imported
+
     def _prepare_database(self) -> None:
-        db_location = Path(__file__).parent.parent / "db" / "db_voice_embeddings"
+        db_location = self._db_path / "db_voice_embeddings"
 
         self._qdrant_client = QdrantClient(path=db_location) # type: ignore
 
         if not self._qdrant_client.collection_exists("voice_embeddings"):
             self._qdrant_client.create_collection(collection_name="voice_embeddings", vectors_config=VectorParams(size=512, distance=Distance.COSINE))
 
-    def _torch_tensor_to_float_list(self, embedding: torch.Tensor) -> list[float]:
-        return embedding.squeeze().cpu().numpy().tolist()
+        # The local mode does not support payload indexes. It does not persist them and logs a warning on every attempt
+        options = self._qdrant_client.init_options
+        is_local = options.get("path") is not None or options.get("location") == ":memory:"
+
+        if not is_local and "name" not in self._qdrant_client.get_collection("voice_embeddings").payload_schema:
+            self._qdrant_client.create_payload_index(
+                collection_name="voice_embeddings",
+                field_name="name",
+                field_schema=models.PayloadSchemaType.KEYWORD
+            )
+
+        self._load_index()
+        self._load_counters()
+
+    def _load_index(self) -> None:
+        """
+        Rebuilds the in-memory index from the embeddings stored on the disk.
+        """
+        self._index.clear()
+
+        offset = None
+        while True:
+            points, offset = self._qdrant_client.scroll(
+                collection_name="voice_embeddings",
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+
+            for point in points:
+                self._index.add(id=str(point.id), name=point.payload["name"], embedding=np.asarray(point.vector, dtype=np.float32)) # type: ignore
+
+            if offset is None:
+                break
+
+    def _load_counters(self) -> None:
+        counters = {}
+        if self._counter_path.exists():
+            counters = json.loads(self._counter_path.read_text())
+
+        # Never hand out a number below one that is already in use, i.e. if the counter file was deleted
+        used_numbers = [
+            int(name[len("UnknownVoice"):]) for name in self._index.names
+            if name.startswith("UnknownVoice") and name[len("UnknownVoice"):].isdigit()
+        ]
+
+        self._next_unknown_voice = max([counters.get("next_unknown_voice", 0)] + [number + 1 for number in used_numbers])
+
+    def _save_counters(self) -> None:
+        # Write to a temporary file first, so a crash can not leave a corrupted counter behind
+        temporary_path = self._counter_path.with_suffix(".tmp")
+        temporary_path.write_text(json.dumps({"next_unknown_voice": self._next_unknown_voice}, indent=4))
+        os.replace(temporary_path, self._counter_path)
+
+    def _torch_tensor_to_numpy(self, embedding: torch.Tensor) -> np.ndarray:
+        return embedding.detach().squeeze().cpu().numpy().astype(np.float32, copy=False)
+
+def _load_npz_mmap(path: Path) -> dict[str, np.ndarray]:
+    """
+    Memory-maps all arrays of an uncompressed npz archive. np.load only memory-maps plain npy files.
+    Only the parts of the archive that are actually accessed are read from the disk.
+
+    Arguments:
+        path (Path): The archive. Must have been written with np.savez, not np.savez_compressed.
+
+    Returns:
+        dict[str, np.ndarray]: The read-only arrays by their name.
+    """
+    arrays = {}
+
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as file:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise Exception(f"Failed to load {path}. The archive is compressed and can not be memory-mapped.")
+
+            # The data of a member starts after its local file header, which has a fixed size of 30 bytes plus the file name and extra field
+            file.seek(info.header_offset)
+            local_header = file.read(30)
+            name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+
+            name = info.filename.removesuffix(".npy")
+
+            if np.prod(shape) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(file.name, dtype=dtype, mode="r", offset=file.tell(), shape=shape, order="F" if fortran_order else "C")
+
+    return arrays
@@ -3,7 +3,7 @@ Description: Provides abstract classes for all custom datatypes.
 """
 
 from abc import ABC, abstractmethod
-from typing import Literal
+from typing import Literal, Callable
 
 from numpy import ndarray
 from torch import Tensor
@@ -109,6 +109,12 @@ class ContextSourceBase(ABC):
 class ContextSource_VoiceABC(ContextSourceBase):
     """
     Context source for results generated by the transcriptor.
+
+    Arguments:
+        speaker (str): The name of the speaker.
+        utterance_id (str): Identifies all revisions of the same utterance. Empty for datapoints that are never revised.
+        revision (int): The revision of the utterance. A datapoint with a higher revision replaces the previous one in the context.
+        final (bool): Whether this is the last revision of the utterance. Partial revisions are speculative and may still change.
     """
     pass
 
@@ -285,6 +291,17 @@ class WordBase(ABC):
     """
     pass
 
+class LanguageLockBase(ABC):
+    """
+    The automatically detected language a single audio stream is locked to. Owned by the stream and handed to the inference engine with every transcription,
+    so a detected language does not carry over to other streams, files or sessions that share the same engine.
+
+    Arguments:
+        language (str, optional): The locked language. None if no language is locked. Defaults to None.
+        locked_at (float, optional): When the language was locked, in seconds of time.monotonic(). Defaults to 0.
+    """
+    pass
+
 class STTConditioningBase(ABC):
     """
     Stores all values required for transcriptor conditioning.
@@ -293,13 +310,77 @@ class STTConditioningBase(ABC):
         model (str): The model to use.
         microphone_index (int): The index of the microphone to use for recording. Defaults to the default microphone.
         language (str): The language of the speech. If set to an empty string, the language will be detected automatically. It is recommended to set this to the language of the speech for better results if known.
+        language_lock (bool): If the language is detected automatically, lock it after the first confident detection instead of detecting it on every pass. It is detected again when a transcription has low confidence. Defaults to True.
+        language_lock_threshold (float): How confident the language detection must be to lock the language. Defaults to 0.8.
+        language_recheck_seconds (float): How many seconds a locked language is kept before it is detected again. 0 keeps it until a transcription has low confidence. Defaults to 300.0.
         device (str): The device to use for the computations. Defaults to "cuda" or "cpu" if cuda is not available.
         voice_boost (float): How much to boost the voice in the audio preprocessing stage. Setting it to 0 disables this feature. Defaults to 10.0.
-        vad_threshold (float): The confidence threshold of the voice-activity-detection model. Audio chunks above this threshold will be considered to contain speech.
+        vad_threshold (float): The confidence threshold of the voice-activity-detection model. Audio frames above this threshold will be considered to contain speech.
         voice_similarity_threshold (float): The threshold for the voice similarity. If the similarity between the speaker and a voice in the database, they will be considered to be the same voice. Defaults to 0.8.
+        speaker_embedding_max_seconds (float): How many seconds of speech the speaker embedding of a sentence is generated from at most. Longer sentences use their longest speech segments. 0 uses the whole sentence. Defaults to 10.0.
+        vad_min_silence_ms (int): How many milliseconds the speech probability must stay low before the voice-activity-detection considers speech to have ended. Defaults to 300.
+        vad_speech_pad_ms (int): How many milliseconds of audio are kept before the start and after the end of detected speech. Defaults to 100.
+        vad_gate_enabled (bool): Whether to check audio frames with a cheap energy and zero-crossing gate before running the voice-activity-detection model on them. Frames rejected by the gate are treated as silence. Defaults to True.
+        vad_energy_threshold_db (float): The minimum loudness of a frame in dBFS to pass the gate. Defaults to -50.0.
+        vad_zcr_max (float): The maximum zero-crossing rate (crossings per sample) of a frame to pass the gate. Defaults to 0.6.
+        audio_buffer_seconds (float): How many seconds of audio the recording ring buffer can hold. Utterances longer than this are cut off at the start. Defaults to 60.0.
+        audio_block_size (int): How many samples the microphone delivers per block. Defaults to 1600 (100ms).
+        audio_queue_size (int): How many chunks of recorded audio can wait for transcription before the overflow policy is applied. Defaults to 8.
+        audio_overflow_policy (Literal["drop_oldest", "merge"]): What happens when the transcription falls behind and the queue is full. "drop_oldest" skips the oldest waiting chunk, "merge" combines the newest chunks so they are transcribed in a single pass. Defaults to "merge".
+        transcription_interval_min (float): The shortest time in seconds between two transcription passes of the live audio. Defaults to 0.3.
+        transcription_interval_max (float): The longest time in seconds between two transcription passes. The interval adapts to the measured transcription latency between both bounds. Set both to the same value for a fixed interval. Defaults to 2.0.
+        endpoint_mode (Literal["punctuation", "silence", "both"]): When a sentence is considered finished. "punctuation" waits for a confirmed word ending with ".", "!" or "?". "silence" waits until the speaker was silent for endpoint_silence_ms. "both" uses whichever comes first. Defaults to "both".
+        endpoint_silence_ms (int): How many milliseconds of silence end a sentence in the "silence" and "both" endpoint modes. Defaults to 700.
+        incremental_transcription (bool): Only decode the part of an utterance that has not been confirmed yet instead of re-transcribing the whole utterance on every pass. Keeps the transcription cost constant for long utterances. Defaults to False.
+        transcription_overlap (float): How many seconds of already confirmed audio are decoded again in incremental mode to give the model some acoustic context. Defaults to 0.5.
+        num_workers (int): How many transcriptions the inference engine may run in parallel, i.e. when transcribing multiple files at once. Defaults to 1.
+        compute_type (str): The precision the model runs in, i.e. "float32", "float16", "int8_float32" or "int8". The quantized types are much faster on CPUs. Defaults to "float32".
+        beam_size (int): How many hypotheses are kept while decoding. 1 decodes greedily, which is faster but slightly less accurate. Defaults to 5.
+        cpu_threads (int): How many CPU threads the inference engine may use. 0 uses all cores. Defaults to 0.
+        speculative (bool): Also yield partial transcriptions of unfinished sentences. They share an utterance_id with the final sentence and are replaced in the context when a newer revision arrives. Defaults to False.
+        audio_source (AudioSourceBase | None): Where the audio is recorded from, i.e. a FileReplaySource or ArraySource. Defaults to None, which records from the microphone set by microphone_index.
+        pipeline_mode (Literal["threaded", "multiprocess"]): "threaded" runs the whole pipeline in this process. "multiprocess" runs the stages listed in pipeline_stages in worker processes that read the audio from shared memory. Defaults to "threaded".
+        pipeline_stages (dict[str, int]): How many worker processes each stage gets in multiprocess mode. Possible stages are "asr" (transcription) and "embedding" (speaker embeddings). Stages with 0 workers run in this process. Defaults to one worker for each stage.
     """
     pass
 
+class AudioSourceBase(ABC):
+    """
+    Provides a base class for all audio sources the STT system can record from.
+    """
+    @abstractmethod
+    def start(self, callback: Callable[[ndarray], None], sample_rate: int, block_size: int) -> None:
+        """
+        Begin to deliver audio. Must not block.
+
+        Arguments:
+            callback (Callable[[ndarray], None]): Called from a background thread for every block of mono float32 audio.
+            sample_rate (int): The sample rate the audio must be delivered in.
+            block_size (int): How many samples should be delivered per block.
+        """
+        raise NotImplementedError
+    @abstractmethod
+    def stop(self) -> None:
+        """
+        Stop delivering audio. The callback will not be called anymore after this returns.
+        """
+        raise NotImplementedError
+    @property
+    @abstractmethod
+    def finished(self) -> bool:
+        """
+        Whether the source has run out of audio. Live sources never finish.
+        """
+        raise NotImplementedError
+    @property
+    def realtime(self) -> bool:
+        """
+        Whether the audio is captured live. Live audio can not wait, so if the pipeline falls behind, the oldest audio is overwritten.
+        Audio of other sources (i.e. replayed files) is cut into chunks by its length instead of by the clock, and the callback blocks until the pipeline has room for it,
+        so no audio is lost and the result does not depend on the speed of the machine. Defaults to True.
+        """
+        return True
+
 class STTInferenceEngineBase(ABC):
     """
     Provides a base class for all STT inference engines to ensure a consistent structure.
@@ -316,18 +397,46 @@ class STTInferenceEngineBase(ABC):
         Frees the VRAM/RAM. The model can not be used anymore after it was freed. It needs to be loaded again by calling select_model().
         """
         raise NotImplementedError
+    @property
+    def input_format(self) -> Literal["numpy", "torch_cpu", "torch_device"]:
+        """
+        The form the engine wants to receive audio in: a numpy array, a torch tensor on the CPU or a torch tensor on the configured device.
+        The pipeline hands over read-only views of its audio buffer in this form, so the audio is not converted or copied. Defaults to "torch_device".
+        """
+        return "torch_device"
     @abstractmethod
-    def run_inference(self, audio_data: Tensor) -> list[WordBase]:
+    def run_inference(self, audio_data: Tensor | ndarray, prompt: str = "", language_lock: LanguageLockBase | None = None) -> list[WordBase]:
         """
         Transcribe audio data into a word array.
 
         Arguments:
-            audio_data (Tensor): The audio data to transcribe as a torch tensor.
+            audio_data (Tensor | ndarray): The float32 audio data to transcribe in the form declared by input_format. It is read-only.
+            prompt (str): Text that was spoken right before the audio. Can be used by the engine to condition the transcription. Defaults to "".
+            language_lock (LanguageLockBase | None): The language lock of the stream the audio belongs to. Engines that detect the language should decode with
+                the locked language and update the lock. If None, the language is not locked. Defaults to None.
 
         Returns:
             LLMResponse: The response from the LLM.
         """
         raise NotImplementedError
+    def run_batch_inference(self, audio_data: list[Tensor | ndarray], prompt: str = "", language_locks: list[LanguageLockBase | None] | None = None) -> list[list[WordBase]]:
+        """
+        Transcribe multiple independent audio segments, i.e. from different streams. Engines that can decode several segments in one pass should override this.
+        By default the segments are transcribed one after another.
+
+        Arguments:
+            audio_data (list[Tensor | ndarray]): The audio segments to transcribe in the form declared by input_format.
+            prompt (str): Text that was spoken right before every segment. Defaults to "".
+            language_locks (list[LanguageLockBase | None] | None): The language lock of the stream of each segment. Segments of streams that are locked
+                to different languages must not be decoded as the same language. Defaults to None.
+
+        Returns:
+            list[list[WordBase]]: The words of each segment. Timestamps are relative to the start of the segment.
+        """
+        if language_locks is None:
+            language_locks = [None] * len(audio_data)
+
+        return [self.run_inference(audio, prompt=prompt, language_lock=language_lock) for audio, language_lock in zip(audio_data, language_locks)]
 
 class LLMConditioningBase(ABC):
     """
@@ -0,0 +1,180 @@
+"""
+Description: Lightweight latency histograms and counters to see where time is spent inside a pipeline. Can be exported as a dict or in the Prometheus text format.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from typing import Generator
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REAL_TIME_FACTOR_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """
+        Counts observations in fixed buckets. Not thread-safe on its own, PipelineMetrics guards it with a lock.
+
+        Arguments:
+            buckets (tuple[float, ...]): The upper bounds of the buckets in ascending order. Larger values are counted in an implicit +Inf bucket.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile from the buckets. Returns the upper bound of the bucket the quantile falls into.
+        """
+        if self.count == 0:
+            return 0.0
+
+        target = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count > 0 else 0.0,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + (float("inf"),), self.counts)}
+        }
+
+class PipelineMetrics:
+    def __init__(self, stages: tuple[str, ...] = (), counters: tuple[str, ...] = ()) -> None:
+        """
+        Collects a latency histogram per stage, counters and the real-time factor of processed audio. Thread-safe.
+        Stages and counters that are not declared upfront are created on first use.
+
+        Arguments:
+            stages (tuple[str, ...]): The stages that should always be reported, even before they were measured.
+            counters (tuple[str, ...]): The counters that should always be reported.
+        """
+        self._lock = Lock()
+        self._stages: dict[str, Histogram] = {stage: Histogram() for stage in stages}
+        self._counters: dict[str, int] = {counter: 0 for counter in counters}
+        self._real_time_factor = Histogram(buckets=REAL_TIME_FACTOR_BUCKETS)
+        self._audio_seconds = 0.0
+        self._processing_seconds = 0.0
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """
+        Records how long a stage took.
+        """
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = Histogram()
+            self._stages[stage].observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Generator[None, None, None]:
+        """
+        Measures the duration of the block and records it for the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def record_real_time_factor(self, audio_seconds: float, processing_seconds: float) -> None:
+        """
+        Records how long it took to process a piece of audio relative to its duration. Values below 1 are faster than real-time.
+        """
+        if audio_seconds <= 0:
+            return
+
+        with self._lock:
+            self._real_time_factor.observe(processing_seconds / audio_seconds)
+            self._audio_seconds += audio_seconds
+            self._processing_seconds += processing_seconds
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages = {stage: Histogram() for stage in self._stages}
+            self._counters = {counter: 0 for counter in self._counters}
+            self._real_time_factor = Histogram(buckets=REAL_TIME_FACTOR_BUCKETS)
+            self._audio_seconds = 0.0
+            self._processing_seconds = 0.0
+
+    def to_dict(self) -> dict:
+        """
+        Returns all metrics as a plain dict. Latencies are in seconds.
+        """
+        with self._lock:
+            return {
+                "stages": {stage: histogram.to_dict() for stage, histogram in self._stages.items()},
+                "counters": dict(self._counters),
+                "real_time_factor": {
+                    **self._real_time_factor.to_dict(),
+                    "overall": self._processing_seconds / self._audio_seconds if self._audio_seconds > 0 else 0.0,
+                    "audio_seconds": self._audio_seconds,
+                    "processing_seconds": self._processing_seconds
+                }
+            }
+
+    def to_prometheus(self, prefix: str = "nova") -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+
+        Arguments:
+            prefix (str): The prefix of all metric names. Defaults to "nova".
+        """
+        lines = []
+
+        with self._lock:
+            name = f"{prefix}_stage_duration_seconds"
+            lines.append(f"# HELP {name} Time spent in each pipeline stage.")
+            lines.append(f"# TYPE {name} histogram")
+            for stage, histogram in self._stages.items():
+                lines += self._format_histogram(name, histogram, f'stage="{stage}",')
+
+            for counter, value in self._counters.items():
+                name = f"{prefix}_{counter}_total"
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {value}")
+
+            name = f"{prefix}_real_time_factor"
+            lines.append(f"# HELP {name} Processing time divided by audio duration per utterance.")
+            lines.append(f"# TYPE {name} histogram")
+            lines += self._format_histogram(name, self._real_time_factor, "")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _format_histogram(name: str, histogram: Histogram, labels: str) -> list[str]:
+        lines = []
+        cumulative = 0
+
+        for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels}le="{le}"}} {cumulative}')
+
+        suffix = "{" + labels.rstrip(",") + "}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {histogram.sum}")
+        lines.append(f"{name}_count{suffix} {histogram.count}")
+
+        return lines
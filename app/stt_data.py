@@ -1,16 +1,21 @@
 """
 Description: Holds all data required to run the transcriptor.
 """
-from typing import Optional
-from dataclasses import dataclass
+from typing import Optional, Literal, Any
+from dataclasses import dataclass, field
+from collections import deque
+from uuid import uuid4
 
 import torch
-import sounddevice as sd
 
 from Nova2.app.interfaces import (
     WordBase,
-    STTConditioningBase
+    LanguageLockBase,
+    STTConditioningBase,
+    AudioSourceBase
 )
+from Nova2.app.audio_buffer import AudioRingBuffer
+from Nova2.app.vad import StreamingVAD
 
 @dataclass
 class Word(WordBase):
@@ -19,16 +24,99 @@ class Word(WordBase):
     end: float = 0.0
     speaker_embedding: Optional[torch.Tensor] = None
 
+@dataclass
+class LanguageLock(LanguageLockBase):
+    language: Optional[str] = None
+    locked_at: float = 0.0
+
+    def reset(self) -> None:
+        """
+        Forgets the locked language, so it is detected again in the next pass.
+        """
+        self.language = None
+        self.locked_at = 0.0
+
+@dataclass
+class Utterance:
+    """
+    A finished sentence together with the speaker embedding of the whole sentence, or a partial revision of an unfinished sentence.
+
+    Arguments:
+        words (list[Word]): The words of the sentence.
+        start (int): The absolute ring buffer position where the sentence begins.
+        end (int): The absolute ring buffer position where the sentence ends.
+        segments (list[tuple[int, int]]): The speech segments the speaker embedding is generated from.
+        speaker_embedding (torch.Tensor | None): The speaker embedding. None until it was generated.
+        utterance_id (str): Identifies all revisions of the sentence.
+        revision (int): Increases with every revision of the sentence.
+        final (bool): Whether the sentence is finished. Partial revisions have no speaker embedding.
+    """
+    words: list[Word]
+    start: int
+    end: int
+    segments: list[tuple[int, int]] = field(default_factory=list)
+    speaker_embedding: Optional[torch.Tensor] = None
+    utterance_id: str = ""
+    revision: int = 0
+    final: bool = True
+
 @dataclass
 class STTConditioning(STTConditioningBase):
     model: str
     inference_engine: str
     microphone_index: int = -1
     language: str = ""
+    language_lock: bool = True
+    language_lock_threshold: float = 0.8
+    language_recheck_seconds: float = 300.0
     device: str = "cuda"
     vad_threshold: float = 0.95
     voice_similarity_threshold: float = 0.8
+    speaker_embedding_max_seconds: float = 10.0
+    vad_min_silence_ms: int = 300
+    vad_speech_pad_ms: int = 100
+    vad_gate_enabled: bool = True
+    vad_energy_threshold_db: float = -50.0
+    vad_zcr_max: float = 0.6
+    audio_buffer_seconds: float = 60.0
+    audio_block_size: int = 1600
+    audio_queue_size: int = 8
+    audio_overflow_policy: Literal["drop_oldest", "merge"] = "merge"
+    transcription_interval_min: float = 0.3
+    transcription_interval_max: float = 2.0
+    endpoint_mode: Literal["punctuation", "silence", "both"] = "both"
+    endpoint_silence_ms: int = 700
+    incremental_transcription: bool = False
+    transcription_overlap: float = 0.5
+    num_workers: int = 1
+    speculative: bool = False
+    compute_type: str = "float32"
+    beam_size: int = 5
+    cpu_threads: int = 0
+    audio_source: Optional[AudioSourceBase] = None
+    pipeline_mode: Literal["threaded", "multiprocess"] = "threaded"
+    pipeline_stages: dict[str, int] = field(default_factory=lambda: {"asr": 1, "embedding": 1})
 
-    def __post_init__(self):
-        if self.microphone_index == -1: # No microphone selected
-            self.microphone_index = sd.default.device[0] # type: ignore
\ No newline at end of file
+@dataclass
+class TranscriptionSession:
+    """
+    Holds the state of a single audio stream that is being transcribed.
+    Every stream (the microphone, or one file of a batch) gets its own session, so several streams can share one pipeline.
+    """
+    ring_buffer: AudioRingBuffer
+    vad: StreamingVAD
+    current_sentence: list[Word] = field(default_factory=list)
+    locked_words: int = 0
+    committed_words: list[Word] = field(default_factory=list) # Locked words whose audio is no longer decoded in incremental mode
+    committed_position: int = 0 # Absolute ring buffer position where the committed words end
+    utterance_start: Optional[int] = None # Absolute ring buffer position where the current utterance begins
+    speech_segments: list[list[Optional[int]]] = field(default_factory=list) # [start, end] positions of the speech in the current utterance. The end is None while speech is ongoing
+    silence_counter: int = 0
+    utterance_id: str = field(default_factory=lambda: uuid4().hex) # Identifies the revisions of the current utterance
+    revision: int = 0 # The revision of the last datapoint emitted for the current utterance
+    partial_text: str = "" # The text of the last partial revision, so unchanged transcriptions are not emitted again
+    last_speaker: str = "" # The speaker of the last finished sentence, used as a guess for partial revisions
+    language_lock: LanguageLock = field(default_factory=LanguageLock) # Every stream detects its own language
+    pending_transcription: Optional[tuple[Any, int]] = None # The future of a transcription that is still running and the position where its audio ends
+    processing_time: float = 0.0 # Seconds spent on VAD and transcription of the current utterance
+    pending_sentences: deque[tuple[Utterance, Any]] = field(default_factory=deque) # Finished sentences and the future of their speaker embedding, waiting for their speaker to be resolved
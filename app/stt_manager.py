@@ -6,23 +6,33 @@ import os
 import queue
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import replace
+from pathlib import Path
 from typing import Generator
+from uuid import uuid4
+from warnings import warn
 
 from Nova2.app.helpers import suppress_output, is_configured
 
 import numpy as np
-import sounddevice as sd
 import torch
 import torch.nn.functional as F
 with suppress_output():
     from speechbrain.inference.speaker import EncoderClassifier
 import silero_vad
 
-from Nova2.app.stt_data import Word, STTConditioning
+from Nova2.app.stt_data import Word, STTConditioning, TranscriptionSession, Utterance, LanguageLock
 from Nova2.app.database_manager import VoiceDatabaseManager
 from Nova2.app.context_data import ContextDatapoint, ContextSource_Voice
 from Nova2.app.interfaces import STTInferenceEngineBase
 from Nova2.app.inference_engine_manager import InferenceEngineManager
+from Nova2.app.audio_buffer import AudioRingBuffer, AudioChunkQueue, to_engine_input
+from Nova2.app.transcription_cadence import TranscriptionCadence
+from Nova2.app.audio_source import MicrophoneSource, read_audio_file
+from Nova2.app.vad import StreamingVAD
+from Nova2.app.stt_multiprocess import STTStagePool, SharedAudioRingBuffer
+from Nova2.app.metrics import PipelineMetrics
 
 SAMPLE_RATE = 16000
 
@@ -42,23 +52,24 @@ class VoiceAnalysis:
         self._inference_engine_manager = InferenceEngineManager()
 
     def configure(self, conditioning: STTConditioning):
-        if not self._conditioning_dirty:
-            raise Exception("Failed to initialize TTS. No TTS conditioning provided.")
+        if not conditioning:
+            raise Exception("Failed to configure STT. No STT conditioning provided.")
         self._conditioning_dirty = conditioning
 
-    def apply_config(self) -> None:
+    def apply_config(self, inference_engine: STTInferenceEngineBase | None = None, speaker_embedding_model: EncoderClassifier | None = None, speaker_lock: "threading.Lock | None" = None) -> None:
+        """
+        Applies the conditioning and loads the models.
+
+        Arguments:
+            inference_engine (STTInferenceEngineBase | None): An already initialized engine to use instead of loading a new one, i.e. one that is shared between several streams. Defaults to None.
+            speaker_embedding_model (EncoderClassifier | None): An already loaded speaker embedding model to use instead of loading a new one. Defaults to None.
+            speaker_lock (threading.Lock | None): A lock shared with other pipelines that resolve speakers against the same voice database. Defaults to None.
+        """
         if self._conditioning_dirty is None:
             raise Exception("Failed to initialize TTS. No TTS conditioning provided.")
 
         self._conditioning = self._conditioning_dirty
 
-        self._inference_engine: STTInferenceEngineBase = self._inference_engine_manager.request_engine(
-            self._conditioning.inference_engine,
-            "STT"
-            ) # type: ignore
-        
-        self._inference_engine.initialize_model(self._conditioning) # type: ignore
-
         self._verbose = False
 
         self._device = self._conditioning.device
@@ -66,92 +77,311 @@ class VoiceAnalysis:
             self._device = "cpu"
             
         torch.set_default_dtype(torch.float32)
+
+        self._stage_pool: STTStagePool | None = None
+        if self._conditioning.pipeline_mode == "multiprocess":
+            self._stage_pool = STTStagePool(
+                conditioning=replace(self._conditioning, device=self._device),
+                stages=self._conditioning.pipeline_stages
+                )
+        elif self._conditioning.pipeline_mode != "threaded":
+            raise ValueError(f"Unknown pipeline mode {self._conditioning.pipeline_mode}. Must be \"threaded\" or \"multiprocess\".")
+
+        # Models of stages that run in worker processes are not loaded in this process
+        if inference_engine is not None:
+            self._inference_engine = inference_engine
+        elif not self._runs_in_worker("asr"):
+            self._inference_engine: STTInferenceEngineBase = self._inference_engine_manager.request_engine(
+                self._conditioning.inference_engine,
+                "STT"
+                ) # type: ignore
+            
+            self._inference_engine.initialize_model(self._conditioning) # type: ignore
         
         self._vad_model = silero_vad.load_silero_vad()
+        self._file_vad_models: queue.SimpleQueue = queue.SimpleQueue() # VAD models of finished file sessions, reused by the next files
 
-        with suppress_output():
-            self._speaker_embedding_model = EncoderClassifier.from_hparams(source="speechbrain/spkrec-xvect-voxceleb", savedir="pretrained_models/spkrec-xvect-voxceleb", run_opts={"device": self._device})
+        if speaker_embedding_model is not None:
+            self._speaker_embedding_model = speaker_embedding_model
+        elif not self._runs_in_worker("embedding"):
+            self._speaker_embedding_model = VoiceProcessingHelpers.load_speaker_embedding_model(device=self._device)
 
-        self._microphone_index = self._conditioning.microphone_index
+        self._audio_source = self._conditioning.audio_source or MicrophoneSource(device_index=self._conditioning.microphone_index)
         self._max_silence_chunks = 3
-        self._current_sentence = []
-        self._locked_words = 0
-        self._audio_queue = queue.Queue()
+        self._audio_queue = AudioChunkQueue(
+            maxsize=self._conditioning.audio_queue_size,
+            overflow_policy=self._conditioning.audio_overflow_policy
+            )
+        self._metrics = PipelineMetrics(
+            stages=("queue_wait", "vad", "asr", "speaker_embedding", "speaker_resolution"),
+            counters=("chunks", "transcriptions", "sentences", "silence_endpoints", "audio_gaps")
+            )
+        self._cadence = TranscriptionCadence(
+            min_interval=self._conditioning.transcription_interval_min,
+            max_interval=self._conditioning.transcription_interval_max
+            )
+        self._stop_event = threading.Event()
+        self._consumer_waiting = threading.Event() # Set while the consumer waits for audio. Tells a blocked replay source that waiting longer will not free any space
+        self._flush_position: int | None = None # Ring buffer position at which the consumer wants the next chunk, regardless of the cadence
+        self._armed_flush_position: int | None = None # The last flush position the consumer requested
+        self._session = self._create_session(vad_model=self._vad_model)
+        self._ring_buffer = self._session.ring_buffer
+        self._speaker_lock = speaker_lock or threading.Lock() # Prevents parallel sessions from creating the same unknown voice twice
         self._is_recording = True
-        self._speculative = False
         self._recording_thread = threading.Thread(target=self._record_audio)
 
+    def _runs_in_worker(self, stage: str) -> bool:
+        return self._stage_pool is not None and self._stage_pool.runs(stage)
+
+    def _create_session(self, vad_model) -> TranscriptionSession:
+        # Worker processes can only read the audio if it is in shared memory
+        buffer_class = SharedAudioRingBuffer if self._stage_pool is not None else AudioRingBuffer
+
+        return TranscriptionSession(
+            ring_buffer=buffer_class(
+                capacity=int(self._conditioning.audio_buffer_seconds * SAMPLE_RATE),
+                block_size=self._conditioning.audio_block_size
+                ),
+            vad=StreamingVAD(
+                model=vad_model,
+                threshold=self._conditioning.vad_threshold,
+                min_silence_ms=self._conditioning.vad_min_silence_ms,
+                speech_pad_ms=self._conditioning.vad_speech_pad_ms,
+                sample_rate=SAMPLE_RATE,
+                gate_enabled=self._conditioning.vad_gate_enabled,
+                energy_threshold_db=self._conditioning.vad_energy_threshold_db,
+                zcr_max=self._conditioning.vad_zcr_max
+                )
+        )
+
     def _record_audio(self) -> None:
-        audio_buffer = np.array([], dtype=np.float32)  
-        silence_start = None
+        chunk_start = self._ring_buffer.write_position
         last_transcription_time = time.time()
+        reported_overruns = 0
+        realtime = self._audio_source.realtime
+
+        def hand_over() -> None:
+            nonlocal chunk_start
+            chunk_end = self._ring_buffer.write_position
+            if chunk_end > chunk_start:
+                self._audio_queue.put(chunk_start, chunk_end, block=not realtime) # Replayed audio waits for the consumer instead of being dropped
+                chunk_start = chunk_end
 
-        def callback(indata, frames, time_info, status):
-            nonlocal audio_buffer, silence_start, last_transcription_time
-            audio = np.frombuffer(indata, dtype=np.float32)  
-            audio_buffer = np.concatenate((audio_buffer, audio))
+        def wait_for_space(length: int) -> None:
+            """
+            Blocks a replay source until the consumer has released enough audio for the block.
+            """
+            while self._ring_buffer.free_space < length and not self._stop_event.is_set():
+                hand_over() # The consumer may only be able to release audio after it has processed the pending audio
 
-            if time.time() - last_transcription_time >= 1:
+                # The consumer is waiting for audio it can not get, i.e. because one utterance is longer than the buffer. Overwriting is the only way forward
+                if self._consumer_waiting.is_set() and len(self._audio_queue) == 0 and len(self._session.pending_sentences) == 0 and self._session.pending_transcription is None:
+                    return
+
+                self._stop_event.wait(0.01)
+
+        def callback(block: np.ndarray) -> None:
+            nonlocal last_transcription_time
+            if not realtime:
+                wait_for_space(len(block))
+
+            self._ring_buffer.write(block)
+
+            # Replayed audio is cut by its length, so chunks do not depend on how fast the source delivers it
+            if realtime:
+                elapsed = time.time() - last_transcription_time
+            else:
+                elapsed = (self._ring_buffer.write_position - chunk_start) / SAMPLE_RATE
+            interval_due = elapsed >= self._cadence.interval
+
+            # The consumer may request the audio early to finish an utterance right when the endpoint silence is reached. The shortest interval of the cadence still applies
+            flush_position = self._flush_position
+            flush_due = flush_position is not None and self._ring_buffer.write_position >= flush_position and elapsed >= self._cadence.min_interval
+
+            if flush_due or interval_due:
+                if flush_due:
+                    self._flush_position = None
                 last_transcription_time = time.time()
-                if len(audio_buffer) > 0:
-                        self._audio_queue.put(audio_buffer)
-                        audio_buffer = np.array([], dtype=np.float32)  
-
-        with sd.InputStream(callback=callback, dtype=np.float32, channels=1, samplerate=SAMPLE_RATE, device=self._microphone_index):
-            while self._is_recording:
-                time.sleep(0.1)
-
-        if len(audio_buffer) > 0:
-            self._audio_queue.put(audio_buffer)
-
-    def _detect_voice_activity(self, audio_chunk: torch.FloatTensor) -> bool:        
-        timestamps = silero_vad.get_speech_timestamps(
-            model=self._vad_model,
-            audio=audio_chunk,
-            threshold=self._conditioning.vad_threshold,
-            sampling_rate=SAMPLE_RATE
-        )
+                hand_over()
+
+        self._audio_source.start(callback=callback, sample_rate=SAMPLE_RATE, block_size=self._ring_buffer.block_size)
+
+        try:
+            # Wakes up regularly to report overruns and notice when a replay source has run out of audio
+            while not self._stop_event.wait(timeout=0.5) and not self._audio_source.finished:
+                if self._ring_buffer.overruns > reported_overruns:
+                    reported_overruns = self._ring_buffer.overruns
+                    warn(f"Audio buffer overrun. {self._ring_buffer.overrun_samples} samples have been overwritten before they were transcribed. Consider increasing audio_buffer_seconds.")
+        finally:
+            self._audio_source.stop()
+
+        hand_over()
+
+        self._audio_queue.close() # Signals that the audio source has no more audio
+
+    def _detect_voice_activity(self, session: TranscriptionSession, chunk_end: int) -> bool:
+        """
+        Runs the streaming VAD on all audio of the session it has not seen yet and records the speech segments.
 
-        return len(timestamps) > 0
+        Arguments:
+            session (TranscriptionSession): The session to run the VAD for.
+            chunk_end (int): The absolute position up to which the VAD should run.
+
+        Returns:
+            bool: Whether the new audio contains any speech.
+        """
+        vad = session.vad
+
+        was_in_speech = vad.in_speech
+        events = vad.process(session.ring_buffer.read(vad.position, chunk_end))
 
-    def _update_transcription(self, words: list[Word]) -> tuple[list[Word], int]:
-        new_locked_words = self._locked_words
+        for event in events:
+            if event.kind == "start":
+                session.speech_segments.append([event.position, None])
+            elif len(session.speech_segments) > 0:
+                session.speech_segments[-1][1] = event.position
+
+        return was_in_speech or vad.in_speech or len(events) > 0
+
+    def _update_transcription(self, session: TranscriptionSession, words: list[Word]) -> tuple[list[Word], int]:
+        new_locked_words = session.locked_words
         for i in range(len(words)):
-            if i < self._locked_words:
+            if i < session.locked_words:
                 continue
-            if i < len(self._current_sentence) and words[i].text == self._current_sentence[i].text:
+            if i < len(session.current_sentence) and words[i].text == session.current_sentence[i].text:
                 new_locked_words += 1
             else:
                 break
         
-        self._current_sentence = words[:new_locked_words] + words[new_locked_words:]
-        self._locked_words = new_locked_words
+        session.current_sentence = words[:new_locked_words] + words[new_locked_words:]
+        session.locked_words = new_locked_words
         
-        return self._current_sentence, self._locked_words
-    
-    def _generate_speaker_embedding(self, audio_data: torch.Tensor) -> torch.Tensor:
-        if audio_data.ndim == 1:
-            audio_data = audio_data.unsqueeze(0)
+        return session.current_sentence, session.locked_words
 
-        # Ensure the audio segment is long enough (at least 1 second)
-        min_length = SAMPLE_RATE  # 1 second at 16000 Hz
-        if audio_data.shape[1] < min_length:
-            # Pad the audio data if it's too short
-            padding = torch.zeros(1, min_length - audio_data.shape[1], device=audio_data.device)
-            audio_data = torch.cat([audio_data, padding], dim=1)
+    def _transcribe(self, session: TranscriptionSession, utterance_start: int, utterance_end: int) -> Future:
+        """
+        Transcribes the utterance between two ring buffer positions.
+        In incremental mode only the audio after the committed words (plus a small overlap) is decoded
+        and the committed text is parsed to the engine as a prompt, so the cost per pass does not grow with the utterance length.
 
-        try:
-            return self._speaker_embedding_model.encode_batch(audio_data) # type: ignore
-        except RuntimeError as e:
-            raise Exception(f"Failed to generate speaker embedding: {e}")
+        Arguments:
+            session (TranscriptionSession): The session the utterance belongs to.
+            utterance_start (int): The absolute position where the utterance begins.
+            utterance_end (int): The absolute position where the utterance currently ends.
+
+        Returns:
+            Future: Resolves to the words of the whole utterance. Timestamps are relative to the start of the utterance.
+        """
+        if not self._conditioning.incremental_transcription or len(session.committed_words) == 0:
+            return self._run_asr(session, utterance_start, utterance_end)
+
+        overlap = int(self._conditioning.transcription_overlap * SAMPLE_RATE)
+        window_start = max(utterance_start, session.committed_position - overlap)
+
+        tail_future = self._run_asr(
+            session,
+            window_start,
+            utterance_end,
+            prompt=VoiceProcessingHelpers.word_array_to_string(session.committed_words)
+            )
+
+        window_offset = (window_start - utterance_start) / SAMPLE_RATE
+        committed_end = (session.committed_position - utterance_start) / SAMPLE_RATE
+        committed_words = list(session.committed_words)
+
+        def merge(tail: list[Word]) -> list[Word]:
+            words = list(committed_words)
+            for word in tail:
+                word.start += window_offset # type: ignore
+                word.end += window_offset # type: ignore
+
+                # Words inside the overlap have already been committed
+                if (word.start + word.end) / 2 < committed_end: # type: ignore
+                    continue
+
+                words.append(word) # type: ignore
+
+            return words
+
+        return _chain_future(tail_future, merge)
+
+    def _run_asr(self, session: TranscriptionSession, start: int, end: int, prompt: str = "") -> Future:
+        """
+        Runs the inference engine on a range of the session audio, either in this process or in an ASR worker process.
+
+        Returns:
+            Future: Resolves to the transcribed words. Already resolved if the engine runs in this process.
+            In a worker process the audio is decoded while the pipeline continues with the next chunk.
+        """
+        start_time = time.perf_counter()
+
+        if self._runs_in_worker("asr"):
+            def adopt_language_lock(result: tuple[list[Word], LanguageLock]) -> list[Word]:
+                words, language_lock = result
+                session.language_lock = language_lock # The worker process updated a copy of the lock
+                return words
+
+            future = _chain_future(self._stage_pool.submit_asr(session.ring_buffer, start, end, prompt, session.language_lock), adopt_language_lock) # type: ignore
+        else:
+            audio_data = to_engine_input(session.ring_buffer.read(start, end), self._inference_engine.input_format, self._device)
+
+            future = Future()
+            future.set_result(self._inference_engine.run_inference(audio_data, prompt=prompt, language_lock=session.language_lock)) # type: ignore
+
+        def record_latency(_: Future) -> None:
+            latency = time.perf_counter() - start_time
+            self._metrics.observe("asr", latency)
+            self._metrics.increment("transcriptions")
+            session.processing_time += latency
+
+            if session is self._session: # Only the live session controls how often it is transcribed
+                self._cadence.record_latency(latency)
+
+        future.add_done_callback(record_latency)
+
+        return future
+
+    def _submit_speaker_embedding(self, session: TranscriptionSession, segments: list[tuple[int, int]]) -> Future:
+        """
+        Generates the speaker embedding of the speech segments of an utterance, either in this process or in an embedding worker process.
+        In worker processes the embedding is generated while the pipeline continues with the next utterance.
+
+        Returns:
+            Future: Resolves to the speaker embedding.
+        """
+        start_time = time.perf_counter()
+
+        if self._runs_in_worker("embedding"):
+            future = self._stage_pool.submit_embedding(session.ring_buffer, segments) # type: ignore
+        else:
+            future = Future()
+            future.set_result(VoiceProcessingHelpers.generate_segment_embedding(
+                self._speaker_embedding_model,
+                [to_engine_input(session.ring_buffer.read(start, end), "torch_device", self._device) for start, end in segments] # type: ignore
+                ))
+
+        future.add_done_callback(lambda _: self._metrics.observe("speaker_embedding", time.perf_counter() - start_time))
+
+        return future
+
+    def _commit_locked_words(self, session: TranscriptionSession, utterance_start: int) -> None:
+        """
+        Moves newly locked words into the committed prefix, so their audio is skipped in the next incremental pass.
+        """
+        if not self._conditioning.incremental_transcription or session.locked_words <= len(session.committed_words):
+            return
 
+        session.committed_words = session.current_sentence[:session.locked_words]
+        session.committed_position = utterance_start + int(session.committed_words[-1].end * SAMPLE_RATE)
+    
     @is_configured
     def start(self) -> Generator[ContextDatapoint, None, None]:
         """
         Generator for live voice analysis.
 
-        Returns a generator object that continuously yields the current sentence that is recorded from the microphone.
-        if "speculative" is set to True, the generator may correct itself in the next pass, if not, it yields the words as they are coming in.
+        Returns a generator object that continuously yields the current sentence that is recorded from the audio source (the microphone by default).
+        If the audio source runs out of audio, the unfinished sentence is yielded and the generator ends.
+        If "speculative" is set in the conditioning, partial revisions of the current sentence are yielded as well. The datapoints of one sentence share an utterance_id and a higher revision replaces the previous one.
         When a sentence is finished, the generator yields the full sentence, until the user continues speaking, which will reset the sentence.
 
         Returns:
@@ -159,100 +389,614 @@ class VoiceAnalysis:
         """
         self._recording_thread.start()
 
-        current_audio_data = None
-        first_audio_chunk = None
-        silence_counter = 0
-        
-        while self._is_recording:
-            if not self._audio_queue.empty():
-                audio_chunk = self._audio_queue.get()
-                speech_detected = self._detect_voice_activity(audio_chunk)
-                if current_audio_data is None:
-                    if not speech_detected:
-                        first_audio_chunk = audio_chunk
-                        continue
-                else:
-                    if not speech_detected:
-                        silence_counter += 1
-                        current_audio_data = np.concatenate((current_audio_data, audio_chunk))
-                        if silence_counter >= self._max_silence_chunks:
-                            continue
-                
-                if speech_detected:
-                    silence_counter = 0
-
-                if current_audio_data is None:
-                    if first_audio_chunk is not None:
-                        current_audio_data = np.concatenate((first_audio_chunk, audio_chunk))
-                    else:
-                        current_audio_data = audio_chunk
-                else:
-                    current_audio_data = np.concatenate((current_audio_data, audio_chunk))
+        try:
+            while True:
+                # Transcriptions and speaker embeddings that run in worker processes are collected while waiting for audio
+                busy = len(self._session.pending_sentences) > 0 or self._session.pending_transcription is not None
+
+                self._consumer_waiting.set()
+                chunk = self._audio_queue.get(timeout=0.05 if busy else None)
+                self._consumer_waiting.clear()
+
+                if chunk is not None:
+                    self._metrics.observe("queue_wait", self._audio_queue.last_wait) # How long the chunk waited for the consumer, not how long the consumer waited for it
+
+                self._apply_pending_transcription(self._session, wait=False)
+                yield from self._collect_sentences(self._session, wait=False)
+
+                if chunk is None:
+                    if not self._audio_queue.closed:
+                        continue # Timed out
+
+                    if self._is_recording: # The audio source ran out of audio
+                        self._finish_session(self._session)
+                        yield from self._collect_sentences(self._session, wait=True)
+                    break
+
+                chunk_start, chunk_end = chunk
+
+                self._process_chunk(self._session, chunk_start, chunk_end)
+
+                self._cadence.update(
+                    queue_depth=len(self._audio_queue),
+                    lag=(self._ring_buffer.write_position - chunk_end) / SAMPLE_RATE
+                    )
+
+                yield from self._collect_sentences(self._session, wait=False)
+        except BaseException:
+            # The consumer failed or the generator was closed. A replay source may be waiting for room in the buffer and has to be released
+            self._stop_event.set()
+            self._audio_queue.close(discard_pending=True)
+            raise
+
+    @is_configured
+    def transcribe_file(self, path: str | Path, chunk_seconds: float = 1.0) -> Generator[ContextDatapoint, None, None]:
+        """
+        Transcribes a WAV or FLAC file as fast as possible instead of at real-time pace.
+        The file is streamed from the disk in chunks (WAV files are memory-mapped) and runs through the same pipeline as the microphone audio.
+        A sentence that is still unfinished when the file ends is yielded as well.
+
+        Arguments:
+            path (str | Path): The audio file to transcribe.
+            chunk_seconds (float): How many seconds of audio are processed per pass. Defaults to 1.0.
 
-                audio_tensor = torch.from_numpy(current_audio_data).float().to(self._device)
-                
-                transcription = self._inference_engine.run_inference(audio_tensor)
+        Returns:
+            Generator[ContextDatapoint]: The generator that yields the transcribed sentences.
+        """
+        # The VAD model is stateful, so each session needs its own. Models of finished files are reused instead of loading a new one for every file
+        try:
+            vad_model = self._file_vad_models.get_nowait()
+        except queue.Empty:
+            vad_model = silero_vad.load_silero_vad()
+
+        session = self._create_session(vad_model=vad_model) # Resets the state of the model
+
+        try:
+            for audio_chunk in VoiceProcessingHelpers.read_audio_file(path=path, chunk_seconds=chunk_seconds):
+                chunk_start = session.ring_buffer.write_position
+                session.ring_buffer.write(audio_chunk)
+
+                self._process_chunk(session, chunk_start, session.ring_buffer.write_position)
+
+                self._apply_pending_transcription(session, wait=False)
+                yield from self._collect_sentences(session, wait=False)
+
+            self._finish_session(session)
+
+            yield from self._collect_sentences(session, wait=True)
+        finally:
+            session.ring_buffer.close()
+            self._file_vad_models.put(vad_model)
 
-                self._current_sentence, self._locked_words = self._update_transcription(transcription) # type: ignore
+    @is_configured
+    def transcribe_many(self, paths: list[str | Path], workers: int = 1, chunk_seconds: float = 1.0) -> Generator[tuple[Path, ContextDatapoint], None, None]:
+        """
+        Transcribes multiple audio files in parallel. All workers share the loaded models.
+        Set num_workers in the conditioning to the same value to let the inference engine decode in parallel as well.
+
+        Arguments:
+            paths (list[str | Path]): The audio files to transcribe.
+            workers (int): How many files are processed at the same time. Defaults to 1.
+            chunk_seconds (float): How many seconds of audio are processed per pass. Defaults to 1.0.
+
+        Returns:
+            Generator[tuple[Path, ContextDatapoint]]: Yields the file together with each transcribed sentence as soon as it is ready.
+            The sentences of one file are yielded in order, sentences of different files are interleaved.
+        """
+        results = queue.Queue()
+        stop_event = threading.Event()
+
+        def worker(path: Path) -> None:
+            try:
+                for datapoint in self.transcribe_file(path=path, chunk_seconds=chunk_seconds):
+                    if stop_event.is_set(): # The caller stopped consuming the results or another file failed
+                        break
+                    results.put((path, datapoint))
+            except Exception as e:
+                results.put((path, e))
+            finally:
+                results.put((path, None)) # Signals that the file is done
 
-                confirmed_transcription: list[Word] = []
-                speculative_transcription: list[Word] = []
-                for i, word in enumerate(self._current_sentence):
-                    if i < self._locked_words:
-                        confirmed_transcription.append(word)
+        paths = [Path(path) for path in paths]
+        remaining = len(paths)
 
-                    speculative_transcription.append(word)
+        executor = ThreadPoolExecutor(max_workers=max(1, workers))
+
+        try:
+            for path in paths:
+                executor.submit(worker, path)
 
-                # Sentence is finished
-                if len(confirmed_transcription) > 0:
-                    if "." in confirmed_transcription[len(confirmed_transcription) - 1].text or "!" in confirmed_transcription[len(confirmed_transcription) - 1].text or "?" in confirmed_transcription[len(confirmed_transcription) - 1].text:
-                        # Generate embedding and assign to all words
-                        speaker_embedding = self._generate_speaker_embedding(audio_tensor)
-                        for word in confirmed_transcription:
-                            word.speaker_embedding = speaker_embedding
-                        
-                        current_audio_data = None
-                        self._current_sentence = []
-                        self._locked_words = 0
+            while remaining > 0:
+                path, result = results.get()
 
-                        # Construct the context datapoint
-                        voice = self._resolve_speaker(words=confirmed_transcription)
-                        datapoint = ContextDatapoint(
-                            source=ContextSource_Voice(speaker=voice),
-                            content=VoiceProcessingHelpers.word_array_to_string(confirmed_transcription)
-                            )
-                        
-                        yield datapoint
+                if result is None:
+                    remaining -= 1
+                elif isinstance(result, Exception):
+                    raise Exception(f"Failed to transcribe {path}: {result}")
+                else:
+                    yield path, result
+        finally:
+            # Don't wait for the remaining files to be transcribed
+            stop_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
 
-    def _resolve_speaker(self, words: list[Word]) -> str:
+    def _process_chunk(self, session: TranscriptionSession, chunk_start: int, chunk_end: int) -> None:
         """
-        Finds the name of the current speaker 
+        Runs one pass of the pipeline (VAD and transcription) after a new chunk of audio was written to the session.
+        Finished sentences are added to the pending sentences of the session and can be retrieved with _collect_sentences.
+
+        Arguments:
+            session (TranscriptionSession): The session the chunk belongs to.
+            chunk_start (int): The absolute position where the new chunk begins.
+            chunk_end (int): The absolute position where the new chunk ends.
         """
-        embedding_list = []
-        for word in words:
-            embedding_list.append(word.speaker_embedding)
+        self._metrics.increment("chunks")
+
+        # Audio between the previous chunk and this one was dropped by the queue or overwritten in the ring buffer
+        lost_until = max(chunk_start, session.ring_buffer.oldest_position)
+        if lost_until > session.vad.position:
+            self._skip_lost_audio(session, lost_until)
+
+        # Runs while the previous chunk may still be transcribed in a worker process
+        vad_start = time.perf_counter()
+        speech_detected = self._detect_voice_activity(session, chunk_end)
+        vad_latency = time.perf_counter() - vad_start
 
-        avg_embedding = VoiceProcessingHelpers.take_average_embedding(embedding_list)
+        self._metrics.observe("vad", vad_latency)
+        if session.utterance_start is not None:
+            session.processing_time += vad_latency
 
-        voice = self._voice_database_manager.get_voice_name_from_embedding(avg_embedding)
+        # The state of the utterance must be up to date before this chunk can be handled
+        self._apply_pending_transcription(session, wait=True)
 
-        if voice and voice[1] > self._conditioning.voice_similarity_threshold: # If voice was found and it's close enough use it. Otherwise create a new one
-            voice_name = voice[0]
+        if session.utterance_start is None:
+            if not speech_detected:
+                # Keep a little audio around, the VAD pads the start of the next speech segment
+                session.ring_buffer.release(chunk_end - int(self._conditioning.vad_speech_pad_ms * SAMPLE_RATE / 1000))
+                session.speech_segments = []
+                return None
         else:
-            voice_name = self._voice_database_manager.create_unknown_voice(avg_embedding)
+            if not speech_detected:
+                session.silence_counter += 1
+
+                # The words of the last pass can not change anymore
+                if len(session.current_sentence) > 0 and self._endpoint_reached(session):
+                    self._finish_sentence(session, session.current_sentence, self._speech_end(session, chunk_end))
+                    self._metrics.increment("silence_endpoints")
+                    return None
+
+                if session.silence_counter >= self._max_silence_chunks:
+                    return None
+        
+        if speech_detected:
+            session.silence_counter = 0
+
+        if session.utterance_start is None:
+            # Start the utterance exactly where the speech starts instead of at a chunk boundary
+            if len(session.speech_segments) > 0:
+                session.utterance_start = max(session.speech_segments[0][0], session.ring_buffer.oldest_position) # type: ignore
+            else:
+                session.utterance_start = chunk_start
+
+        # Cut off trailing silence once the speech has ended
+        utterance_end = chunk_end
+        if not session.vad.in_speech and len(session.speech_segments) > 0 and session.speech_segments[-1][1] is not None:
+            utterance_end = min(chunk_end, session.speech_segments[-1][1]) # type: ignore
+
+        if utterance_end <= session.utterance_start:
+            return None
+
+        session.pending_transcription = (self._transcribe(session, session.utterance_start, utterance_end), utterance_end)
+
+        # Engines in this process are done right away. Results of worker processes are applied once they are ready, at the latest with the next chunk
+        self._apply_pending_transcription(session, wait=False)
+
+    def _apply_pending_transcription(self, session: TranscriptionSession, wait: bool) -> None:
+        """
+        Updates the sentence in progress with the result of the last transcription.
+
+        Arguments:
+            session (TranscriptionSession): The session to update.
+            wait (bool): Whether to wait for a transcription that is still running. If False, an unfinished transcription is left pending.
+        """
+        if session.pending_transcription is None:
+            return
+
+        future, utterance_end = session.pending_transcription
+
+        if not wait and not future.done():
+            return
+
+        session.pending_transcription = None
+        self._apply_transcription(session, future.result(), utterance_end)
+
+    def _apply_transcription(self, session: TranscriptionSession, transcription: list[Word], utterance_end: int) -> None:
+        """
+        Locks and commits the words that did not change since the last pass and finishes the sentence if an endpoint was reached.
+        """
+        self._update_transcription(session, transcription)
+        self._commit_locked_words(session, session.utterance_start)
+
+        confirmed_transcription: list[Word] = []
+        for i, word in enumerate(session.current_sentence):
+            if i < session.locked_words:
+                confirmed_transcription.append(word)
+
+        # The speaker stopped long enough. No more audio can confirm the remaining words, so all of them are used
+        if len(session.current_sentence) > 0 and self._endpoint_reached(session):
+            self._finish_sentence(session, session.current_sentence, self._speech_end(session, utterance_end))
+            self._metrics.increment("silence_endpoints")
+            return None
+
+        # Sentence is finished
+        if len(confirmed_transcription) > 0 and self._conditioning.endpoint_mode in ("punctuation", "both"):
+            if "." in confirmed_transcription[len(confirmed_transcription) - 1].text or "!" in confirmed_transcription[len(confirmed_transcription) - 1].text or "?" in confirmed_transcription[len(confirmed_transcription) - 1].text:
+                self._finish_sentence(session, confirmed_transcription, utterance_end)
+                return None
+
+        if self._conditioning.speculative:
+            self._add_partial_sentence(session, utterance_end)
+
+        if session is self._session:
+            self._request_endpoint_flush(session)
+
+    def _skip_lost_audio(self, session: TranscriptionSession, position: int) -> None:
+        """
+        Continues the session after a gap in the audio. The sentence in progress can not continue across the gap,
+        so it is finished with the words it has so far. The audio of the gap is neither analyzed nor transcribed.
+
+        Arguments:
+            session (TranscriptionSession): The session that lost audio.
+            position (int): The absolute position where the audio continues.
+        """
+        self._apply_pending_transcription(session, wait=True)
+
+        lost_from = session.vad.position
+        self._metrics.increment("audio_gaps")
+
+        if session.utterance_start is not None and len(session.current_sentence) > 0 and lost_from > max(session.utterance_start, session.ring_buffer.oldest_position):
+            self._finish_sentence(session, session.current_sentence, lost_from)
+
+        session.utterance_start = None
+        session.current_sentence = []
+        session.locked_words = 0
+        session.committed_words = []
+        session.silence_counter = 0
+
+        session.vad.skip_to(position)
+        session.speech_segments = []
+
+        # The audio of pending sentences may still be needed to generate their speaker embedding
+        if all(embedding.done() for _, embedding in session.pending_sentences):
+            session.ring_buffer.release(position)
+
+    def _add_partial_sentence(self, session: TranscriptionSession, utterance_end: int) -> None:
+        """
+        Adds the current hypothesis of the unfinished sentence to the pending sentences, if it changed since the last revision.
+        """
+        text = VoiceProcessingHelpers.word_array_to_string(session.current_sentence)
+        if text.strip() == "" or text == session.partial_text:
+            return
+
+        session.partial_text = text
+        session.revision += 1
+
+        no_embedding = Future()
+        no_embedding.set_result(None)
+
+        partial = Utterance(
+            words=list(session.current_sentence),
+            start=session.utterance_start, # type: ignore
+            end=utterance_end,
+            utterance_id=session.utterance_id,
+            revision=session.revision,
+            final=False
+            )
+        session.pending_sentences.append((partial, no_embedding))
+
+    def _endpoint_reached(self, session: TranscriptionSession) -> bool:
+        """
+        Whether the speaker has been silent for long enough to end the utterance.
+        """
+        if self._conditioning.endpoint_mode not in ("silence", "both"):
+            return False
+
+        return session.vad.silence_samples >= int(self._conditioning.endpoint_silence_ms * SAMPLE_RATE / 1000)
+
+    def _speech_end(self, session: TranscriptionSession, utterance_end: int) -> int:
+        """
+        Where the utterance ends if it is ended by silence: after the last speech plus padding.
+        """
+        speech_end = session.vad.last_speech_position + int(self._conditioning.vad_speech_pad_ms * SAMPLE_RATE / 1000)
+        return max(session.utterance_start, min(utterance_end, speech_end)) # type: ignore
+
+    def _request_endpoint_flush(self, session: TranscriptionSession) -> None:
+        """
+        Asks the recording thread to hand over the audio as soon as the endpoint silence would be reached,
+        so the utterance is finished at that moment instead of at the next regular transcription pass.
+        """
+        # Only a pause in the speech can become an endpoint. Each pause is flushed once, even if the consumer is still behind when it asks again
+        if self._conditioning.endpoint_mode not in ("silence", "both") or session.utterance_start is None or session.vad.in_speech:
+            self._flush_position = None
+            return
+
+        flush_position = session.vad.last_speech_position + int(self._conditioning.endpoint_silence_ms * SAMPLE_RATE / 1000)
+        if flush_position != self._armed_flush_position:
+            self._armed_flush_position = flush_position
+            self._flush_position = flush_position
+
+    def _finish_session(self, session: TranscriptionSession) -> None:
+        """
+        Finishes the sentence that is still in progress when a stream ends. All words are used, because no more audio can confirm them.
+        """
+        self._apply_pending_transcription(session, wait=True)
+
+        if session.utterance_start is None or len(session.current_sentence) == 0:
+            return
+
+        self._finish_sentence(session, session.current_sentence, session.ring_buffer.write_position)
+
+    def _finish_sentence(self, session: TranscriptionSession, words: list[Word], utterance_end: int) -> None:
+        """
+        Requests the speaker embedding of a finished sentence, adds the sentence to the pending sentences and resets the session.
+        The audio of the sentence is only released once the embedding was generated.
+        """
+        utterance = Utterance(
+            words=words,
+            start=session.utterance_start, # type: ignore
+            end=utterance_end,
+            segments=self._embedding_segments(session, utterance_end),
+            utterance_id=session.utterance_id,
+            revision=session.revision + 1
+            )
+        session.pending_sentences.append((utterance, self._submit_speaker_embedding(session, utterance.segments)))
+
+        session.utterance_id = uuid4().hex
+        session.revision = 0
+        session.partial_text = ""
+
+        self._metrics.increment("sentences")
+        self._metrics.record_real_time_factor(
+            audio_seconds=(utterance_end - session.utterance_start) / SAMPLE_RATE, # type: ignore
+            processing_seconds=session.processing_time
+            )
+        session.processing_time = 0.0
+
+        session.utterance_start = None
+        # The speaker continues with the next sentence. The VAD may already have seen audio after the sentence, if the transcription was applied late
+        session.speech_segments = [
+            [max(segment_start, utterance_end), segment_end] for segment_start, segment_end in session.speech_segments # type: ignore
+            if segment_end is None or segment_end > utterance_end
+        ]
+        session.current_sentence = []
+        session.locked_words = 0
+        session.committed_words = []
+
+    def _embedding_segments(self, session: TranscriptionSession, utterance_end: int) -> list[tuple[int, int]]:
+        """
+        Selects the speech the speaker embedding of an utterance is generated from. The VAD speech segments are reused, so silence is left out.
+        Long utterances are capped to the longest segments that fit into speaker_embedding_max_seconds, so the cost of the embedding stays bounded.
+        """
+        start = max(session.utterance_start, session.ring_buffer.oldest_position) # type: ignore
+
+        segments = []
+        for segment_start, segment_end in session.speech_segments:
+            segment_start = max(start, segment_start) # type: ignore
+            segment_end = min(utterance_end, segment_end if segment_end is not None else utterance_end)
+            if segment_end > segment_start:
+                segments.append((segment_start, segment_end))
+
+        if len(segments) == 0:
+            segments = [(start, utterance_end)]
+
+        budget = int(self._conditioning.speaker_embedding_max_seconds * SAMPLE_RATE)
+        if budget <= 0 or sum(end - start for start, end in segments) <= budget:
+            return segments
+
+        selected = []
+        for segment_start, segment_end in sorted(segments, key=lambda segment: segment[1] - segment[0], reverse=True):
+            if budget <= 0:
+                break
+
+            # Keep the middle of segments that do not fit completely, the edges often contain breathing or cut-off words
+            excess = max(0, (segment_end - segment_start) - budget)
+            segment_start += excess // 2
+            segment_end -= excess - excess // 2
+
+            selected.append((segment_start, segment_end))
+            budget -= segment_end - segment_start
+
+        return sorted(selected)
+
+    def _collect_sentences(self, session: TranscriptionSession, wait: bool) -> Generator[ContextDatapoint, None, None]:
+        """
+        Resolves the speakers of the pending sentences in order and constructs the context datapoints.
+
+        Arguments:
+            session (TranscriptionSession): The session to collect the sentences from.
+            wait (bool): Whether to wait for embeddings that are still being generated. If False, collection stops at the first unfinished sentence.
+
+        Returns:
+            Generator[ContextDatapoint]: Yields the finished sentences.
+        """
+        while len(session.pending_sentences) > 0:
+            utterance, embedding = session.pending_sentences[0]
+
+            if not wait and not embedding.done():
+                return
+
+            session.pending_sentences.popleft()
+
+            if not utterance.final:
+                # The speaker of a partial sentence is not known yet, the last speaker is the best guess
+                yield ContextDatapoint(
+                    source=ContextSource_Voice(speaker=session.last_speaker or "Unknown", utterance_id=utterance.utterance_id, revision=utterance.revision, final=False),
+                    content=VoiceProcessingHelpers.word_array_to_string(utterance.words)
+                    )
+                continue
+
+            session.ring_buffer.release(utterance.end)
+
+            utterance.speaker_embedding = embedding.result()
+            if isinstance(utterance.speaker_embedding, np.ndarray):
+                utterance.speaker_embedding = torch.from_numpy(utterance.speaker_embedding)
+
+            # Construct the context datapoint
+            with self._metrics.time("speaker_resolution"):
+                voice = self._resolve_speaker(utterance.speaker_embedding)
+            session.last_speaker = voice
+
+            yield ContextDatapoint(
+                source=ContextSource_Voice(speaker=voice, utterance_id=utterance.utterance_id, revision=utterance.revision),
+                content=VoiceProcessingHelpers.word_array_to_string(utterance.words)
+                )
+
+    def _resolve_speaker(self, avg_embedding: torch.Tensor) -> str:
+        """
+        Finds the name of the speaker of an utterance 
+        """
+        with self._speaker_lock:
+            voice = self._voice_database_manager.get_voice_name_from_embedding(avg_embedding)
+
+            if voice and voice[1] > self._conditioning.voice_similarity_threshold: # If voice was found and it's close enough use it. Otherwise create a new one
+                voice_name = voice[0]
+            else:
+                voice_name = self._voice_database_manager.create_unknown_voice(avg_embedding)
 
         return voice_name
     
+    @is_configured
+    def get_vad_stats(self) -> dict[str, int]:
+        """
+        Returns how many audio frames of the live session each stage of the voice-activity-detection has rejected.
+
+        Returns:
+            dict[str, int]: The total amount of frames, the frames rejected by the energy gate, the frames rejected by the model and the frames that contained speech.
+        """
+        return self._session.vad.stats
+
+    @is_configured
+    def calibrate(
+            self,
+            reference_audio: str | Path | np.ndarray,
+            reference_text: str,
+            compute_types: tuple[str, ...] = ("float32", "int8_float32", "int8"),
+            beam_sizes: tuple[int, ...] = (1, 5),
+            cpu_threads: tuple[int, ...] = (0,),
+            max_word_error_rate: float = 0.15,
+            runs: int = 2
+            ) -> dict:
+        """
+        Benchmarks combinations of decoding options on a reference clip and recommends the fastest one that stays within a word error budget.
+        A single engine is used, but the model is loaded again for every combination, so this can take a while. The applied configuration is not changed.
+
+        Arguments:
+            reference_audio (str | Path | np.ndarray): A WAV or FLAC file or mono float32 audio at 16kHz.
+            reference_text (str): What is said in the reference clip.
+            compute_types (tuple[str, ...]): The compute types to try. Defaults to ("float32", "int8_float32", "int8").
+            beam_sizes (tuple[int, ...]): The beam sizes to try. Defaults to (1, 5).
+            cpu_threads (tuple[int, ...]): The CPU thread counts to try. 0 uses all cores. Defaults to (0,).
+            max_word_error_rate (float): The highest word error rate a combination may have to be recommended. Defaults to 0.15.
+            runs (int): How many timed transcriptions are averaged per combination, after one warm-up run. Defaults to 2.
+
+        Returns:
+            dict: "results" holds the compute_type, beam_size, cpu_threads, seconds, real_time_factor and word_error_rate of every combination, fastest first.
+            "recommended" holds the fastest combination within the budget, or None if no combination met it.
+        """
+        if isinstance(reference_audio, np.ndarray):
+            audio = reference_audio.astype(np.float32, copy=False).reshape(-1)
+        else:
+            audio = np.concatenate(list(VoiceProcessingHelpers.read_audio_file(path=reference_audio)))
+
+        audio_seconds = len(audio) / SAMPLE_RATE
+
+        results = []
+
+        # One engine loads the model of every combination in turn. Loading a model frees the previous one
+        engine: STTInferenceEngineBase = self._inference_engine_manager.request_engine(self._conditioning.inference_engine, "STT") # type: ignore
+
+        try:
+            for compute_type in compute_types:
+                for threads in cpu_threads:
+                    for beam_size in beam_sizes:
+                        conditioning = replace(self._conditioning, device=self._device, compute_type=compute_type, beam_size=beam_size, cpu_threads=threads)
+
+                        try:
+                            engine.initialize_model(conditioning)
+                        except Exception as e:
+                            warn(f"Skipping compute type {compute_type}, beam size {beam_size}, {threads} CPU threads: {e}")
+                            continue
+
+                        audio_data = to_engine_input(audio, engine.input_format, self._device)
+
+                        words = engine.run_inference(audio_data) # Warm-up
+
+                        start_time = time.perf_counter()
+                        for _ in range(max(1, runs)):
+                            words = engine.run_inference(audio_data)
+                        seconds = (time.perf_counter() - start_time) / max(1, runs)
+
+                        results.append({
+                            "compute_type": compute_type,
+                            "beam_size": beam_size,
+                            "cpu_threads": threads,
+                            "seconds": seconds,
+                            "real_time_factor": seconds / audio_seconds if audio_seconds > 0 else 0.0,
+                            "word_error_rate": VoiceProcessingHelpers.word_error_rate(reference_text, VoiceProcessingHelpers.word_array_to_string(words)) # type: ignore
+                        })
+        finally:
+            engine.free()
+
+        results.sort(key=lambda result: result["seconds"])
+
+        recommended = None
+        for result in results:
+            if result["word_error_rate"] <= max_word_error_rate:
+                recommended = result
+                break
+
+        return {
+            "recommended": recommended,
+            "results": results
+        }
+
+    @is_configured
+    def get_metrics(self) -> PipelineMetrics:
+        """
+        Returns the latency histograms of every pipeline stage (queue_wait, vad, asr, speaker_embedding and speaker_resolution),
+        the counters and the real-time factor of the finished utterances. Covers the live session and all transcribed files.
+
+        Returns:
+            PipelineMetrics: The metrics. Use to_dict() or to_prometheus() to export them.
+        """
+        return self._metrics
+
+    @is_configured
+    def get_transcription_cadence(self) -> dict[str, float]:
+        """
+        Returns how often the live audio is currently transcribed and how far the transcription lags behind the recording.
+
+        Returns:
+            dict[str, float]: The current interval between transcription passes, the smoothed transcription latency (both in seconds),
+            the amount of chunks waiting in the queue and the seconds of recorded audio that have not been processed yet.
+        """
+        return self._cadence.stats
+
     @is_configured
     def close(self) -> None:
         """
         Ends the execution of this script. No more data will be yielded by the generator.
         """
         self._is_recording = False
-        self._audio_queue = queue.Queue()
+        self._stop_event.set()
+        self._audio_queue.close(discard_pending=True)
         if self._recording_thread.is_alive():
             self._recording_thread.join()
 
+        if self._stage_pool is not None:
+            self._stage_pool.shutdown()
+        self._ring_buffer.close()
+
     def _split_audio_by_timestamps(self, audio_data: torch.Tensor, start: float, end: float) -> torch.Tensor:
         start_sample = int(start * SAMPLE_RATE)
         end_sample = int(end * SAMPLE_RATE)
@@ -261,6 +1005,22 @@ class VoiceAnalysis:
 
         return audio_data
 
+def _chain_future(future: Future, function) -> Future:
+    """
+    Returns a future that resolves to the result of the function applied to the result of the given future.
+    """
+    chained = Future()
+
+    def resolve(done: Future) -> None:
+        try:
+            chained.set_result(function(done.result()))
+        except Exception as e:
+            chained.set_exception(e)
+
+    future.add_done_callback(resolve)
+
+    return chained
+
 class VoiceProcessingHelpers:
     def __init__(self):
         """
@@ -284,6 +1044,116 @@ class VoiceProcessingHelpers:
             text += word.text
         return text
         
+    @staticmethod
+    def read_audio_file(path: str | Path, chunk_seconds: float = 1.0) -> Generator[np.ndarray, None, None]:
+        """
+        Streams an audio file from the disk in chunks of mono float32 audio at 16kHz.
+        WAV files are memory-mapped, all other formats supported by libsndfile (i.e. FLAC) are read block by block.
+
+        Arguments:
+            path (str | Path): The audio file to read.
+            chunk_seconds (float): The length of each chunk in seconds. Defaults to 1.0.
+
+        Returns:
+            Generator[np.ndarray]: Yields the chunks in order.
+        """
+        return read_audio_file(path=path, chunk_seconds=chunk_seconds, sample_rate=SAMPLE_RATE)
+        
+    @staticmethod
+    def load_speaker_embedding_model(device: str) -> EncoderClassifier:
+        """
+        Loads the model that generates speaker embeddings.
+
+        Arguments:
+            device (str): The device to load the model on.
+
+        Returns:
+            EncoderClassifier: The speaker embedding model.
+        """
+        with suppress_output():
+            return EncoderClassifier.from_hparams(source="speechbrain/spkrec-xvect-voxceleb", savedir="pretrained_models/spkrec-xvect-voxceleb", run_opts={"device": device}) # type: ignore
+
+    @staticmethod
+    def generate_speaker_embedding(model: EncoderClassifier, audio_data: torch.Tensor) -> torch.Tensor:
+        """
+        Generates the speaker embedding of an audio segment.
+
+        Arguments:
+            model (EncoderClassifier): The speaker embedding model.
+            audio_data (torch.Tensor): The mono audio at 16kHz.
+
+        Returns:
+            torch.Tensor: The speaker embedding.
+        """
+        return VoiceProcessingHelpers.generate_segment_embedding(model, [audio_data.reshape(-1)])
+
+    @staticmethod
+    def generate_segment_embedding(model: EncoderClassifier, segments: list[torch.Tensor]) -> torch.Tensor:
+        """
+        Generates the speaker embedding of several speech segments of the same speaker.
+        All segments are encoded in a single batch and their embeddings are averaged, weighted by the length of each segment.
+
+        Arguments:
+            model (EncoderClassifier): The speaker embedding model.
+            segments (list[torch.Tensor]): The mono audio of each segment at 16kHz.
+
+        Returns:
+            torch.Tensor: The speaker embedding.
+        """
+        # Ensure every segment is long enough (at least 1 second)
+        min_length = SAMPLE_RATE  # 1 second at 16000 Hz
+        lengths = [max(len(segment), min_length) for segment in segments]
+        max_length = max(lengths)
+
+        batch = torch.zeros(len(segments), max_length, device=segments[0].device)
+        for i, segment in enumerate(segments):
+            batch[i, :len(segment)] = segment
+
+        # Relative lengths tell the model which part of each row is padding. Short segments are padded with silence like before
+        wav_lens = torch.tensor([length / max_length for length in lengths], device=batch.device)
+
+        try:
+            embeddings = model.encode_batch(batch, wav_lens=wav_lens) # type: ignore
+        except RuntimeError as e:
+            raise Exception(f"Failed to generate speaker embedding: {e}")
+
+        # Every embedding counts with the length the model encoded, so the weights match wav_lens
+        weights = wav_lens.to(embeddings.device) / wav_lens.sum()
+
+        return (embeddings * weights.view(-1, *([1] * (embeddings.ndim - 1)))).sum(dim=0, keepdim=True)
+
+    @staticmethod
+    def word_error_rate(reference: str, hypothesis: str) -> float:
+        """
+        Computes the word error rate of a transcription. Case and punctuation are ignored.
+
+        Arguments:
+            reference (str): The correct text.
+            hypothesis (str): The transcribed text.
+
+        Returns:
+            float: The amount of substituted, deleted and inserted words divided by the amount of words in the reference.
+        """
+        def normalize(text: str) -> list[str]:
+            return "".join(char if char.isalnum() or char.isspace() or char == "'" else " " for char in text.lower()).split()
+
+        reference_words = normalize(reference)
+        hypothesis_words = normalize(hypothesis)
+
+        if len(reference_words) == 0:
+            return 0.0 if len(hypothesis_words) == 0 else 1.0
+
+        # Levenshtein distance over words, keeping only one row of the table
+        distances = list(range(len(hypothesis_words) + 1))
+        for i, reference_word in enumerate(reference_words, start=1):
+            previous_diagonal, distances[0] = distances[0], i
+            for j, hypothesis_word in enumerate(hypothesis_words, start=1):
+                substitution = previous_diagonal + (reference_word != hypothesis_word)
+                previous_diagonal = distances[j]
+                distances[j] = min(distances[j] + 1, distances[j - 1] + 1, substitution)
+
+        return distances[-1] / len(reference_words)
+
     @staticmethod
     def compare_embeddings(emb1: torch.FloatTensor, emb2: torch.FloatTensor) -> float:
         """
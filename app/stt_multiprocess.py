@@ -0,0 +1,177 @@
+"""
+Description: Runs the expensive stages of the STT pipeline (transcription and speaker embedding) in separate processes.
+Audio is handed over through shared memory ring buffers, so it is never pickled. Only sample positions and results cross process boundaries.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, Future
+from dataclasses import replace
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import torch
+
+from Nova2.app.audio_buffer import AudioRingBuffer, to_engine_input
+from Nova2.app.stt_data import STTConditioning, Word, LanguageLock
+
+STAGES = ("asr", "embedding")
+
+class SharedAudioRingBuffer(AudioRingBuffer):
+    _HEADER_SIZE = 8 # The write position is stored in front of the samples
+
+    def __init__(self, capacity: int, block_size: int = 1600, name: str | None = None) -> None:
+        """
+        A ring buffer that lives in shared memory, so other processes can read the recorded audio without copying it.
+        The process that creates the buffer owns it and is the only one that writes. Other processes attach to it by name and only read.
+
+        Arguments:
+            capacity (int): How many samples the buffer can hold.
+            block_size (int): The amount of samples the producer is expected to write at once.
+            name (str | None): The name of an existing buffer to attach to. Creates a new buffer if None. Defaults to None.
+        """
+        self._owner = name is None
+
+        if self._owner:
+            self._shared_memory = SharedMemory(create=True, size=self._HEADER_SIZE + capacity * 2 * np.dtype(np.float32).itemsize)
+        else:
+            # Worker processes share the resource tracker of the owner, so attaching does not transfer ownership
+            self._shared_memory = SharedMemory(name=name)
+
+        self._positions = np.ndarray((1,), dtype=np.int64, buffer=self._shared_memory.buf)
+
+        super().__init__(capacity=capacity, block_size=block_size)
+
+    def _allocate(self, length: int) -> np.ndarray:
+        return np.ndarray((length,), dtype=np.float32, buffer=self._shared_memory.buf, offset=self._HEADER_SIZE)
+
+    @property
+    def _write_position(self) -> int: # type: ignore
+        return int(self._positions[0])
+
+    @_write_position.setter
+    def _write_position(self, value: int) -> None:
+        if self._owner: # Attached buffers are read-only
+            self._positions[0] = value
+
+    @property
+    def name(self) -> str:
+        return self._shared_memory.name
+
+    def close(self) -> None:
+        # The views into the shared memory must be gone before it can be closed
+        self._buffer = None # type: ignore
+        self._positions = None # type: ignore
+
+        self._shared_memory.close()
+        if self._owner:
+            self._shared_memory.unlink()
+
+class STTStagePool:
+    def __init__(self, conditioning: STTConditioning, stages: dict[str, int]) -> None:
+        """
+        Manages one process pool per offloaded pipeline stage. Every worker process loads the model of its stage once.
+
+        Arguments:
+            conditioning (STTConditioning): The conditioning used to load the models in the worker processes.
+            stages (dict[str, int]): How many worker processes each stage gets. Possible stages are "asr" and "embedding". Stages that are missing or have 0 workers run in the main process.
+        """
+        for stage in stages:
+            if stage not in STAGES:
+                raise ValueError(f"Unknown pipeline stage {stage}. Possible stages are {STAGES}.")
+
+        conditioning = replace(conditioning, audio_source=None) # Audio sources stay in the main process and may not be picklable
+
+        context = get_context("spawn") # CUDA and the loaded models do not survive a fork
+
+        self._executors: dict[str, ProcessPoolExecutor] = {}
+
+        for stage, workers in stages.items():
+            if workers > 0:
+                self._executors[stage] = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=context,
+                    initializer=_initialize_worker,
+                    initargs=(stage, conditioning)
+                )
+
+    def runs(self, stage: str) -> bool:
+        """
+        Whether a stage runs in worker processes.
+        """
+        return stage in self._executors
+
+    def submit_asr(self, buffer: SharedAudioRingBuffer, start: int, end: int, prompt: str = "", language_lock: LanguageLock | None = None) -> Future:
+        """
+        Transcribes a range of a shared ring buffer in a worker process.
+
+        Returns:
+            Future: Resolves to the transcribed list[Word] and the updated copy of the language lock. Timestamps are relative to the start of the range.
+        """
+        return self._executors["asr"].submit(_asr_job, buffer.name, buffer.capacity, start, end, prompt, language_lock)
+
+    def submit_embedding(self, buffer: SharedAudioRingBuffer, segments: list[tuple[int, int]]) -> Future:
+        """
+        Generates the speaker embedding of speech segments of a shared ring buffer in a worker process.
+
+        Returns:
+            Future: Resolves to the speaker embedding as a numpy array.
+        """
+        return self._executors["embedding"].submit(_embedding_job, buffer.name, buffer.capacity, segments)
+
+    def shutdown(self) -> None:
+        for executor in self._executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._executors = {}
+
+# Everything below runs inside the worker processes
+_MAX_ATTACHED_BUFFERS = 8
+
+_worker_stage = ""
+_worker_model = None
+_worker_device = "cpu"
+_attached_buffers: OrderedDict[str, SharedAudioRingBuffer] = OrderedDict()
+
+def _initialize_worker(stage: str, conditioning: STTConditioning) -> None:
+    global _worker_stage, _worker_model, _worker_device
+
+    from Nova2.app.stt_manager import VoiceProcessingHelpers
+    from Nova2.app.inference_engine_manager import InferenceEngineManager
+
+    _worker_stage = stage
+    _worker_device = conditioning.device
+
+    torch.set_default_dtype(torch.float32)
+
+    if stage == "asr":
+        _worker_model = InferenceEngineManager().request_engine(conditioning.inference_engine, "STT")
+        _worker_model.initialize_model(conditioning) # type: ignore
+    elif stage == "embedding":
+        _worker_model = VoiceProcessingHelpers.load_speaker_embedding_model(device=_worker_device)
+
+def _attach(name: str, capacity: int) -> SharedAudioRingBuffer:
+    if name in _attached_buffers:
+        _attached_buffers.move_to_end(name)
+        return _attached_buffers[name]
+
+    buffer = SharedAudioRingBuffer(capacity=capacity, name=name)
+    _attached_buffers[name] = buffer
+
+    if len(_attached_buffers) > _MAX_ATTACHED_BUFFERS:
+        _, oldest = _attached_buffers.popitem(last=False)
+        oldest.close()
+
+    return buffer
+
+def _asr_job(name: str, capacity: int, start: int, end: int, prompt: str, language_lock: LanguageLock | None) -> tuple[list[Word], LanguageLock | None]:
+    audio_data = to_engine_input(_attach(name, capacity).read(start, end), _worker_model.input_format, _worker_device) # type: ignore
+
+    return _worker_model.run_inference(audio_data, prompt=prompt, language_lock=language_lock), language_lock # type: ignore
+
+def _embedding_job(name: str, capacity: int, segments: list[tuple[int, int]]) -> np.ndarray:
+    from Nova2.app.stt_manager import VoiceProcessingHelpers
+
+    buffer = _attach(name, capacity)
+    audio_tensors = [to_engine_input(buffer.read(start, end), "torch_device", _worker_device) for start, end in segments]
+
+    return VoiceProcessingHelpers.generate_segment_embedding(_worker_model, audio_tensors).cpu().numpy()
@@ -0,0 +1,244 @@
+"""
+Description: Transcribes multiple audio streams at once with a single loaded model. Pending transcriptions of all streams are batched into one decode call.
+"""
+
+from concurrent.futures import Future
+from dataclasses import replace
+from threading import Thread, Condition, Lock
+from typing import Literal
+import time
+
+import numpy as np
+from numpy import ndarray
+import torch
+from torch import Tensor
+
+from Nova2.app.interfaces import STTConditioningBase, STTInferenceEngineBase, WordBase, AudioSourceBase, LanguageLockBase
+from Nova2.app.inference_engine_manager import InferenceEngineManager
+from Nova2.app.stt_data import STTConditioning
+from Nova2.app.stt_manager import VoiceAnalysis, VoiceProcessingHelpers, EncoderClassifier
+
+class STTBatcher:
+    def __init__(self, engine: STTInferenceEngineBase, max_batch_size: int = 8, max_batch_wait: float = 0.05) -> None:
+        """
+        Collects transcription requests from multiple threads and runs them through the engine in batches.
+        A batch is decoded once it is full or the oldest request has waited for the maximum wait time.
+
+        Arguments:
+            engine (STTInferenceEngineBase): The initialized engine that runs the batches.
+            max_batch_size (int): How many requests are decoded at once at most. Defaults to 8.
+            max_batch_wait (float): How many seconds a request may wait for others to fill the batch. Defaults to 0.05.
+        """
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be greater than 0")
+
+        self._engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+
+        self._requests: list[tuple[Tensor | ndarray, str, LanguageLockBase | None, Future, float]] = []
+        self._condition = Condition()
+        self._closed = False
+
+        self.batches = 0
+        self.batched_requests = 0
+
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, audio_data: Tensor | ndarray, prompt: str = "", language_lock: LanguageLockBase | None = None) -> Future:
+        """
+        Adds a transcription request to the next batch.
+        The language lock of the requesting stream is handed to the engine, so every stream keeps its own language.
+
+        Returns:
+            Future: Resolves to the transcribed list[Word].
+        """
+        future = Future()
+
+        # The audio may be a view of a ring buffer. The buffer can overwrite it while the request waits for the batch to fill
+        if isinstance(audio_data, Tensor):
+            audio_data = audio_data.clone()
+        else:
+            audio_data = np.array(audio_data)
+
+        with self._condition:
+            if self._closed:
+                raise Exception("Failed to transcribe. The STT batcher was closed.")
+
+            self._requests.append((audio_data, prompt, language_lock, future, time.perf_counter()))
+            self._condition.notify()
+
+        return future
+
+    @property
+    def input_format(self) -> Literal["numpy", "torch_cpu", "torch_device"]:
+        return self._engine.input_format
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.batched_requests / self.batches if self.batches > 0 else 0.0
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._requests) > 0 or self._closed)
+
+                if self._closed and len(self._requests) == 0:
+                    return
+
+                # Give the other streams a moment to fill the batch
+                deadline = self._requests[0][4] + self.max_batch_wait
+                while len(self._requests) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = self._requests[:self.max_batch_size]
+                self._requests = self._requests[self.max_batch_size:]
+
+            # Requests can only share a decode call if they share the same prompt
+            groups: dict[str, list[tuple[Tensor | ndarray, LanguageLockBase | None, Future]]] = {}
+            for audio_data, prompt, language_lock, future, _ in batch:
+                groups.setdefault(prompt, []).append((audio_data, language_lock, future))
+
+            for prompt, requests in groups.items():
+                self.batches += 1
+                self.batched_requests += len(requests)
+
+                try:
+                    results = self._engine.run_batch_inference(
+                        [audio_data for audio_data, _, _ in requests],
+                        prompt=prompt,
+                        language_locks=[language_lock for _, language_lock, _ in requests]
+                        )
+                except Exception as e:
+                    for _, _, future in requests:
+                        future.set_exception(e)
+                    continue
+
+                for (_, _, future), words in zip(requests, results):
+                    future.set_result(words)
+
+    def close(self) -> None:
+        """
+        Stops the batcher once all pending requests are decoded.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        self._thread.join()
+
+class _BatchingEngineProxy(STTInferenceEngineBase):
+    def __init__(self, batcher: STTBatcher) -> None:
+        """
+        Stands in for the inference engine of a single stream and forwards its requests to the shared batcher.
+        The model is owned by the service, so it is neither loaded nor freed by the stream.
+        """
+        self._batcher = batcher
+
+    def initialize_model(self, conditioning: STTConditioningBase) -> None:
+        pass
+
+    def free(self) -> None:
+        pass
+
+    @property
+    def input_format(self) -> Literal["numpy", "torch_cpu", "torch_device"]:
+        return self._batcher.input_format
+
+    def run_inference(self, audio_data: Tensor | ndarray, prompt: str = "", language_lock: LanguageLockBase | None = None) -> list[WordBase]:
+        return self._batcher.submit(audio_data, prompt=prompt, language_lock=language_lock).result()
+
+class MultiStreamSTT:
+    def __init__(
+            self,
+            conditioning: STTConditioning,
+            max_batch_size: int = 8,
+            max_batch_wait: float = 0.05,
+            inference_engine: STTInferenceEngineBase | None = None,
+            speaker_embedding_model: EncoderClassifier | None = None,
+            speaker_lock: "Lock | None" = None
+            ) -> None:
+        """
+        Transcribes several audio streams (i.e. multiple rooms or microphones) at the same time.
+        All streams share one inference engine and one speaker embedding model, so the memory usage barely grows with the number of streams.
+        Only the small, stateful VAD model is loaded per stream. Every stream detects and locks its own language, streams locked to different languages are not decoded in the same batch pass.
+
+        Arguments:
+            conditioning (STTConditioning): The conditioning used by all streams. The audio source is set per stream.
+            max_batch_size (int): How many transcriptions of different streams are decoded at once at most. Defaults to 8.
+            max_batch_wait (float): How many seconds a transcription may wait for other streams to fill the batch. Defaults to 0.05.
+            inference_engine (STTInferenceEngineBase | None): An already initialized engine to use instead of loading a new one. It is not freed when the service is closed. Defaults to None.
+            speaker_embedding_model (EncoderClassifier | None): An already loaded speaker embedding model to use instead of loading a new one. Defaults to None.
+            speaker_lock (Lock | None): A lock shared with other pipelines that resolve speakers against the same voice database. Defaults to None.
+        """
+        # Worker processes can not share the model with the streams
+        self._conditioning = replace(conditioning, pipeline_mode="threaded", audio_source=None)
+
+        self._owns_engine = inference_engine is None
+        if inference_engine is not None:
+            self._engine = inference_engine
+        else:
+            self._engine: STTInferenceEngineBase = InferenceEngineManager().request_engine(self._conditioning.inference_engine, "STT") # type: ignore
+            self._engine.initialize_model(self._conditioning)
+
+        if speaker_embedding_model is not None:
+            self._speaker_embedding_model = speaker_embedding_model
+        else:
+            device = self._conditioning.device
+            if device == "cuda" and not torch.cuda.is_available():
+                device = "cpu"
+
+            self._speaker_embedding_model = VoiceProcessingHelpers.load_speaker_embedding_model(device=device)
+
+        self._batcher = STTBatcher(engine=self._engine, max_batch_size=max_batch_size, max_batch_wait=max_batch_wait)
+        self._speaker_lock = speaker_lock or Lock() # All streams resolve speakers against the same voice database
+        self._streams: list[VoiceAnalysis] = []
+
+    def add_stream(self, audio_source: AudioSourceBase) -> VoiceAnalysis:
+        """
+        Adds a stream to the service. Call start() on the returned pipeline to receive the transcription of the stream.
+
+        Arguments:
+            audio_source (AudioSourceBase): Where the audio of the stream is recorded from.
+
+        Returns:
+            VoiceAnalysis: The configured pipeline of the stream.
+        """
+        stream = VoiceAnalysis()
+        stream.configure(replace(self._conditioning, audio_source=audio_source))
+        stream.apply_config(
+            inference_engine=_BatchingEngineProxy(self._batcher),
+            speaker_embedding_model=self._speaker_embedding_model,
+            speaker_lock=self._speaker_lock
+            )
+
+        self._streams.append(stream)
+
+        return stream
+
+    @property
+    def streams(self) -> list[VoiceAnalysis]:
+        return list(self._streams)
+
+    @property
+    def average_batch_size(self) -> float:
+        """
+        How many transcriptions were decoded per call on average.
+        """
+        return self._batcher.average_batch_size
+
+    def close(self) -> None:
+        """
+        Stops all streams and frees the shared models, unless they were handed in.
+        """
+        for stream in self._streams:
+            stream.close()
+        self._streams = []
+
+        self._batcher.close()
+        if self._owns_engine:
+            self._engine.free()
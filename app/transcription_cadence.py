@@ -0,0 +1,68 @@
+"""
+Description: Adapts how often recorded audio is handed to the transcription to how fast the transcription runs.
+"""
+
+class TranscriptionCadence:
+    def __init__(self, min_interval: float = 0.3, max_interval: float = 2.0, headroom: float = 1.5, smoothing: float = 0.3) -> None:
+        """
+        Decides how often the recorded audio is handed to the transcription, based on how long the transcription takes.
+        The interval follows the smoothed inference latency (times a headroom factor), so a slow machine transcribes less often instead of falling behind
+        and a fast machine transcribes more often to reduce latency. Chunks that are still waiting in the queue stretch the interval further.
+
+        Arguments:
+            min_interval (float): The shortest interval in seconds. Defaults to 0.3.
+            max_interval (float): The longest interval in seconds. Defaults to 2.0.
+            headroom (float): How much longer than the inference latency the interval should be. Defaults to 1.5.
+            smoothing (float): The weight of a new latency measurement in the moving average. Defaults to 0.3.
+        """
+        if min_interval <= 0:
+            raise ValueError("min_interval must be greater than 0")
+        if max_interval < min_interval:
+            raise ValueError("max_interval must not be smaller than min_interval")
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.headroom = headroom
+        self.smoothing = smoothing
+
+        self.latency = 0.0 # Smoothed inference latency in seconds
+        self.queue_depth = 0
+        self.lag = 0.0 # Seconds of recorded audio that have not been processed yet
+        self.interval = min_interval # Read by the producer, only modified by the consumer
+
+    def record_latency(self, seconds: float) -> None:
+        """
+        Adds a measurement of how long one inference took.
+        """
+        if self.latency == 0.0:
+            self.latency = seconds
+        else:
+            self.latency += self.smoothing * (seconds - self.latency)
+
+    def update(self, queue_depth: int, lag: float) -> float:
+        """
+        Recomputes the interval after the consumer finished a chunk.
+
+        Arguments:
+            queue_depth (int): How many chunks are still waiting in the queue.
+            lag (float): How many seconds of recorded audio have not been processed yet.
+
+        Returns:
+            float: The new interval in seconds.
+        """
+        self.queue_depth = queue_depth
+        self.lag = lag
+
+        interval = self.latency * self.headroom * (1 + queue_depth)
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
+
+        return self.interval
+
+    @property
+    def stats(self) -> dict[str, float]:
+        return {
+            "interval": self.interval,
+            "latency": self.latency,
+            "queue_depth": self.queue_depth,
+            "lag": self.lag
+        }
@@ -1,10 +1,14 @@
 """
 Description: Holds all data required to run TTS inference.
 """
+from pathlib import Path
+
 from Nova2.app.interfaces import (
     TTSConditioningBase
 )
 
+TTS_VOICE_PATH = Path(__file__).resolve().parent.parent / "data" / "voices" # Voice embeddings of the TTS engines
+
 class TTSConditioning(TTSConditioningBase):
     def __init__(
                 self,
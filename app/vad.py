@@ -0,0 +1,240 @@
+"""
+Description: Streaming voice activity detection that keeps its state across audio chunks.
+"""
+
+from dataclasses import dataclass
+from typing import Literal, Any
+
+import numpy as np
+
+from Nova2.app.audio_buffer import to_engine_input
+
+@dataclass
+class VADEvent:
+    """
+    Marks the start or the end of speech.
+
+    Arguments:
+        kind (Literal["start", "end"]): Whether speech started or ended.
+        position (int): The absolute sample position of the event, including padding.
+    """
+    kind: Literal["start", "end"]
+    position: int
+
+class StreamingVAD:
+    FRAME_SIZE = 512 # Silero expects frames of 512 samples at 16kHz
+
+    def __init__(
+            self,
+            model: Any,
+            threshold: float = 0.5,
+            neg_threshold: float | None = None,
+            min_silence_ms: int = 300,
+            speech_pad_ms: int = 100,
+            sample_rate: int = 16000,
+            gate_enabled: bool = True,
+            energy_threshold_db: float = -50.0,
+            zcr_max: float = 0.6
+            ) -> None:
+        """
+        Runs the silero VAD model frame by frame and keeps the model state between chunks.
+        Speech probabilities are smoothed with a hysteresis: speech starts once a frame surpasses the threshold
+        and only ends after the probability stayed below the negative threshold for the minimum silence duration.
+        Frames are first checked by a cheap energy and zero-crossing gate. Only frames that pass it are run through the model,
+        all others count as silence, so silent audio costs almost no CPU time.
+
+        Arguments:
+            model (Any): The silero VAD model. It is stateful, so every stream needs its own instance.
+            threshold (float): The probability a frame must reach to start speech. Defaults to 0.5.
+            neg_threshold (float | None): The probability a frame must fall below to count as silence. Defaults to threshold - 0.15.
+            min_silence_ms (int): How long the silence must last before speech ends. Defaults to 300.
+            speech_pad_ms (int): How much audio is added before the start and after the end of speech. Defaults to 100.
+            sample_rate (int): The sample rate of the audio. Defaults to 16000.
+            gate_enabled (bool): Whether to run the energy and zero-crossing gate in front of the model. Defaults to True.
+            energy_threshold_db (float): The minimum RMS energy of a frame in dBFS to pass the gate. Defaults to -50.0.
+            zcr_max (float): The maximum zero-crossing rate (crossings per sample) of a frame to pass the gate. Noise crosses zero far more often than speech. Defaults to 0.6.
+        """
+        self._model = model
+        self.threshold = threshold
+        self.neg_threshold = neg_threshold if neg_threshold is not None else max(threshold - 0.15, 0.01)
+        self.sample_rate = sample_rate
+        self._min_silence_samples = int(min_silence_ms * sample_rate / 1000)
+        self._speech_pad_samples = int(speech_pad_ms * sample_rate / 1000)
+        self._state_reset_samples = max(self._min_silence_samples, self.FRAME_SIZE) # How long the gate must reject frames before the model state is reset
+
+        self.gate_enabled = gate_enabled
+        self.energy_threshold_db = energy_threshold_db
+        self.zcr_max = zcr_max
+
+        self.frames_total = 0
+        self.frames_rejected_gate = 0 # Frames the energy and zero-crossing gate classified as silence
+        self.frames_rejected_model = 0 # Frames that passed the gate, but the model classified as silence
+
+        self._frame = np.zeros(self.FRAME_SIZE, dtype=np.float32)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Resets the model state and forgets all speech that has been detected so far.
+        """
+        self._model.reset_states()
+        self._frame_fill = 0
+        self.position = 0 # Absolute position of the next sample that will be processed
+        self.in_speech = False
+        self.speech_start: int | None = None # Start of the current speech segment
+        self.last_speech_position = 0 # End of the last frame that contained speech
+        self._silence_start: int | None = None
+        self.last_probability = 0.0
+        self._stream_start = 0 # Speech can not be padded to before this position, the audio before it was skipped
+        self._gated_samples = 0 # Length of the current run of frames the gate rejected
+
+    def skip_to(self, position: int) -> None:
+        """
+        Continues the stream at a later position, i.e. after audio was lost. The partial frame is discarded.
+        Speech in progress ends without an end event and the model state is reset, because the audio before the gap says nothing about the audio after it.
+
+        Arguments:
+            position (int): The absolute position of the next sample that will be processed.
+        """
+        if position > self.position:
+            self._model.reset_states()
+            self.position = position
+            self._stream_start = position
+            self._frame_fill = 0
+            self.in_speech = False
+            self.speech_start = None
+            self._silence_start = None
+            self._gated_samples = 0
+
+    @property
+    def silence_samples(self) -> int:
+        """
+        How many samples have passed since the last frame that contained speech.
+        """
+        return self.position - self.last_speech_position
+
+    def process(self, audio: np.ndarray) -> list[VADEvent]:
+        """
+        Runs the VAD on the next chunk of the stream. Samples that do not fill a whole frame are kept for the next chunk.
+
+        Arguments:
+            audio (np.ndarray): The next mono float32 chunk of the stream.
+
+        Returns:
+            list[VADEvent]: The speech start and end events that occurred in this chunk.
+        """
+        events = []
+        offset = 0
+        chunk_start = self.position
+        self.position += len(audio)
+
+        # Complete the frame that was left over from the previous chunk
+        if self._frame_fill > 0:
+            offset = min(len(audio), self.FRAME_SIZE - self._frame_fill)
+            self._frame[self._frame_fill:self._frame_fill + offset] = audio[:offset]
+            self._frame_fill += offset
+
+            if self._frame_fill < self.FRAME_SIZE:
+                return events
+
+            self._process_frames(self._frame.reshape(1, -1), chunk_start - (self.FRAME_SIZE - offset), events)
+            self._frame_fill = 0
+
+        frame_count = (len(audio) - offset) // self.FRAME_SIZE
+        if frame_count > 0:
+            frames = np.ascontiguousarray(audio[offset:offset + frame_count * self.FRAME_SIZE], dtype=np.float32).reshape(frame_count, self.FRAME_SIZE)
+            self._process_frames(frames, chunk_start + offset, events)
+            offset += frame_count * self.FRAME_SIZE
+
+        remainder = len(audio) - offset
+        self._frame[:remainder] = audio[offset:]
+        self._frame_fill = remainder
+
+        return events
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """
+        Counters of how many frames each stage of the VAD cascade has rejected.
+        """
+        return {
+            "frames_total": self.frames_total,
+            "frames_rejected_gate": self.frames_rejected_gate,
+            "frames_rejected_model": self.frames_rejected_model,
+            "frames_speech": self.frames_total - self.frames_rejected_gate - self.frames_rejected_model
+        }
+
+    def _gate(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Vectorized energy and zero-crossing check for a batch of frames.
+
+        Arguments:
+            frames (np.ndarray): The frames with shape (n, FRAME_SIZE).
+
+        Returns:
+            np.ndarray: A boolean mask with shape (n) that is True for frames that might contain speech.
+        """
+        energy = np.einsum("ij,ij->i", frames, frames) / self.FRAME_SIZE
+        energy_db = 10 * np.log10(energy + 1e-10)
+
+        zero_crossings = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1) / (self.FRAME_SIZE - 1)
+
+        return (energy_db >= self.energy_threshold_db) & (zero_crossings <= self.zcr_max)
+
+    def _process_frames(self, frames: np.ndarray, first_frame_start: int, events: list[VADEvent]) -> None:
+        passed = self._gate(frames) if self.gate_enabled else np.ones(len(frames), dtype=bool)
+
+        self.frames_total += len(frames)
+
+        for i, frame in enumerate(frames):
+            frame_start = first_frame_start + i * self.FRAME_SIZE
+
+            if not passed[i]:
+                self.frames_rejected_gate += 1
+                self._gated_samples += self.FRAME_SIZE
+                self._apply_probability(0.0, frame_start, events)
+                continue
+
+            # After a long silence the model state is outdated. Short gaps, i.e. a quiet frame inside speech, keep the state, so the model still knows the speech context
+            if self._gated_samples > self._state_reset_samples:
+                self._model.reset_states()
+            self._gated_samples = 0
+
+            probability = self._model(to_engine_input(frame, "torch_cpu", "cpu"), self.sample_rate).item()
+
+            if probability < self.threshold and not (self.in_speech and probability >= self.neg_threshold):
+                self.frames_rejected_model += 1
+
+            self._apply_probability(probability, frame_start, events)
+
+    def _apply_probability(self, probability: float, frame_start: int, events: list[VADEvent]) -> None:
+        frame_end = frame_start + self.FRAME_SIZE
+        self.last_probability = probability
+
+        if probability >= self.threshold:
+            self._silence_start = None
+            self.last_speech_position = frame_end
+
+            if not self.in_speech:
+                self.in_speech = True
+                self.speech_start = max(self._stream_start, frame_start - self._speech_pad_samples)
+                events.append(VADEvent(kind="start", position=self.speech_start))
+            return
+
+        if not self.in_speech:
+            return
+
+        if probability >= self.neg_threshold:
+            # Between both thresholds speech continues
+            self._silence_start = None
+            self.last_speech_position = frame_end
+            return
+
+        if self._silence_start is None:
+            self._silence_start = frame_start
+
+        if frame_end - self._silence_start >= self._min_silence_samples:
+            self.in_speech = False
+            events.append(VADEvent(kind="end", position=self._silence_start + self._speech_pad_samples))
+            self.speech_start = None
+            self._silence_start = None
@@ -1,19 +1,26 @@
+from bisect import bisect_right
 from os import cpu_count
+from typing import Literal
 from warnings import warn
+import time
 
-from faster_whisper import WhisperModel
+from faster_whisper import WhisperModel, BatchedInferencePipeline
+import numpy as np
 from numpy import ndarray
 from torch import Tensor
 
-from Nova2.app.interfaces import STTConditioningBase, STTInferenceEngineBase, WordBase
-from Nova2.app.stt_data import STTConditioning, Word
+from Nova2.app.interfaces import STTConditioningBase, STTInferenceEngineBase, WordBase, LanguageLockBase
+from Nova2.app.stt_data import STTConditioning, Word, LanguageLock
 
 class InferenceEngineFasterWhisper(STTInferenceEngineBase):
+    _LOW_CONFIDENCE_LOGPROB = -1.0 # Segments below whisper's default log probability threshold are considered unreliable
+
     def __init__(self) -> None:
         """
         This class runs STT inference via faster-whisper.
         """
         self._model: WhisperModel = None # type: ignore
+        self._batched_pipeline: BatchedInferencePipeline = None # type: ignore
         self._conditioning: STTConditioning = None # type: ignore
 
     def initialize_model(self, conditioning: STTConditioningBase) -> None:
@@ -21,34 +28,172 @@ class InferenceEngineFasterWhisper(STTInferenceEngineBase):
         
         self._conditioning = conditioning # type: ignore
 
-        cpu_cores = cpu_count()
+        cpu_cores = self._conditioning.cpu_threads
+
+        if cpu_cores <= 0:
+            cpu_cores = cpu_count()
 
-        if not cpu_cores:
-            cpu_cores = 1
-            warn("Failed to detect CPU core count. Defaulting to 1.")
+            if not cpu_cores:
+                cpu_cores = 1
+                warn("Failed to detect CPU core count. Defaulting to 1.")
         
         self._model = WhisperModel(
             model_size_or_path=self._conditioning.model,
             device=self._conditioning.device,
-            compute_type="float32",
-            cpu_threads=cpu_cores
+            compute_type=self._conditioning.compute_type,
+            cpu_threads=cpu_cores,
+            num_workers=self._conditioning.num_workers
             )
         
-    def run_inference(self, audio_data: Tensor) -> list[WordBase]:
-        audio_data = audio_data.cpu().numpy() # type: ignore
+    @property
+    def input_format(self) -> Literal["numpy", "torch_cpu", "torch_device"]:
+        return "numpy" # ctranslate2 runs on numpy arrays, handing over tensors would only cause device round trips
+
+    def run_inference(self, audio_data: Tensor | ndarray, prompt: str = "", language_lock: LanguageLockBase | None = None) -> list[WordBase]:
+        if isinstance(audio_data, Tensor):
+            audio_data = audio_data.cpu().numpy()
+
+        initial_prompt = prompt if prompt != "" else None
+        language = self._language(language_lock) # type: ignore
+
+        segments, info = self._model.transcribe(audio_data, beam_size=self._conditioning.beam_size, language=language, condition_on_previous_text=False, word_timestamps=True, initial_prompt=initial_prompt) # type: ignore | A language of None lets whisper autodetect it
 
-        if self._conditioning.language != "":
-            segments, info = self._model.transcribe(audio_data, beam_size=5, language=self._conditioning.language, condition_on_previous_text=False, word_timestamps=True) # type: ignore
-        else:
-            segments, info = self._model.transcribe(audio_data, beam_size=5, condition_on_previous_text=False, word_timestamps=True) # type: ignore | Leave the language undefined so whisper autodetects it
         transcription = []
+        confident = True
         for segment in segments:
+            confident = confident and segment.avg_logprob >= self._LOW_CONFIDENCE_LOGPROB
             for word in segment.words: # type: ignore
                 transcription.append(Word(text=word.word, start=word.start, end=word.end))
+
+        self._update_language_lock(language_lock, language, info.language, info.language_probability, confident) # type: ignore
+
         return transcription
-    
+
+    def _language(self, language_lock: LanguageLock | None) -> str | None:
+        """
+        The language to decode with. None runs the language detection.
+        """
+        if self._conditioning.language != "":
+            return self._conditioning.language
+
+        if language_lock is None or language_lock.language is None:
+            return None
+
+        # Verify the locked language from time to time, the speaker may have switched languages
+        if self._conditioning.language_recheck_seconds > 0 and time.monotonic() - language_lock.locked_at >= self._conditioning.language_recheck_seconds:
+            return None
+
+        return language_lock.language
+
+    def _update_language_lock(self, language_lock: LanguageLock | None, used_language: str | None, detected_language: str, probability: float, confident: bool) -> None:
+        if language_lock is None or self._conditioning.language != "" or not self._conditioning.language_lock:
+            return
+
+        if used_language is None:
+            # Only lock on a confident detection, otherwise detect again in the next pass
+            if probability >= self._conditioning.language_lock_threshold:
+                language_lock.language = detected_language
+                language_lock.locked_at = time.monotonic()
+            else:
+                language_lock.reset()
+        elif not confident:
+            # The locked language might be wrong, detect it again in the next pass
+            language_lock.reset()
+
+    def run_batch_inference(self, audio_data: list[Tensor | ndarray], prompt: str = "", language_locks: list[LanguageLockBase | None] | None = None) -> list[list[WordBase]]:
+        if language_locks is None:
+            language_locks = [None] * len(audio_data)
+
+        if len(audio_data) == 1:
+            return [self.run_inference(audio_data[0], prompt=prompt, language_lock=language_locks[0])]
+
+        # One pass decodes all segments in the same language. Streams that are locked to different languages are decoded separately.
+        # The batched pipeline only detects the language at the start of the batch, so segments without a known language are transcribed one at a time
+        languages = [self._language(language_lock) for language_lock in language_locks] # type: ignore
+        if len(set(languages)) > 1 or languages[0] is None:
+            groups: dict[str | None, list[int]] = {}
+            for i, language in enumerate(languages):
+                groups.setdefault(language, []).append(i)
+
+            transcriptions: list[list[WordBase]] = [[] for _ in audio_data]
+            for language, indices in groups.items():
+                if language is None:
+                    for i in indices:
+                        transcriptions[i] = self.run_inference(audio_data[i], prompt=prompt, language_lock=language_locks[i])
+                    continue
+
+                results = self.run_batch_inference([audio_data[i] for i in indices], prompt=prompt, language_locks=[language_locks[i] for i in indices])
+                for i, words in zip(indices, results):
+                    transcriptions[i] = words
+
+            return transcriptions
+
+        if self._batched_pipeline is None:
+            self._batched_pipeline = BatchedInferencePipeline(model=self._model)
+
+        # All segments are decoded in one pass. The clip timestamps (in samples) mark where each segment lies in the concatenated audio.
+        # Segments longer than whisper's 30 second window are split into multiple clips.
+        max_clip_length = self._model.feature_extractor.n_samples
+        sampling_rate = self._model.feature_extractor.sampling_rate
+
+        audio_parts = []
+        clip_timestamps = []
+        clip_owners = [] # (segment index, start of the clip within the segment in seconds)
+        offset = 0
+
+        for i, audio in enumerate(audio_data):
+            if isinstance(audio, Tensor):
+                audio = audio.cpu().numpy()
+            audio = audio.reshape(-1)
+            audio_parts.append(audio)
+
+            for clip_start in range(0, len(audio), max_clip_length):
+                clip_end = min(len(audio), clip_start + max_clip_length)
+                clip_timestamps.append({"start": offset + clip_start, "end": offset + clip_end})
+                clip_owners.append((i, clip_start / sampling_rate))
+
+            offset += len(audio)
+
+        transcriptions: list[list[WordBase]] = [[] for _ in audio_data]
+
+        if len(clip_timestamps) == 0:
+            return transcriptions
+
+        clip_start_times = [clip["start"] / sampling_rate for clip in clip_timestamps]
+        language = languages[0]
+
+        segments, info = self._batched_pipeline.transcribe(
+            np.concatenate(audio_parts),
+            language=language, # A language of None lets whisper autodetect it
+            beam_size=self._conditioning.beam_size,
+            batch_size=len(clip_timestamps),
+            condition_on_previous_text=False,
+            word_timestamps=True,
+            initial_prompt=prompt if prompt != "" else None,
+            clip_timestamps=clip_timestamps,
+            vad_filter=False
+            ) # type: ignore
+
+        confident = True
+        for segment in segments:
+            confident = confident and segment.avg_logprob >= self._LOW_CONFIDENCE_LOGPROB
+
+            # Segment timestamps are relative to the concatenated audio. Map them back to the segment they belong to
+            clip = max(0, bisect_right(clip_start_times, segment.start + 0.02) - 1) # Tolerates the rounding of the timestamps
+            owner, clip_offset = clip_owners[clip]
+            time_offset = clip_start_times[clip] - clip_offset
+
+            for word in segment.words: # type: ignore
+                transcriptions[owner].append(Word(text=word.word, start=word.start - time_offset, end=word.end - time_offset))
+
+        for language_lock in language_locks:
+            self._update_language_lock(language_lock, language, info.language, info.language_probability, confident) # type: ignore
+
+        return transcriptions
+
     def free(self) -> None:
-        del self._model
+        self._batched_pipeline = None # type: ignore
+        self._model = None # type: ignore | Keeps the engine usable for the next initialize_model, even if loading a model failed
 
     @property
     def model(self) -> str:
@@ -9,7 +9,7 @@ import numpy as np
 from Nova2.external.zonos.model import Zonos
 from Nova2.external.zonos.conditioning import make_cond_dict
 from Nova2.app.interfaces import TTSInferenceEngineBase
-from Nova2.app.tts_data import TTSConditioning
+from Nova2.app.tts_data import TTSConditioning, TTS_VOICE_PATH
 from Nova2.app.audio_data import AudioData
 
 class InferenceEngineZonos(TTSInferenceEngineBase):
@@ -20,7 +20,7 @@ class InferenceEngineZonos(TTSInferenceEngineBase):
 
         self._model: Zonos = None # type: ignore
         self._model_name: str = ""
-        self._voice_files = Path(__file__).resolve().parent.parent.parent.parent / "data" / "voices"
+        self._voice_files = TTS_VOICE_PATH
         self._device = "cuda"
 
         super().__init__()
@@ -3,11 +3,36 @@ Description: Tests for Nova2.
 """
 
 import unittest
+import threading
+import time
+import types
+import tempfile
+import warnings
+from pathlib import Path
+from concurrent.futures import Future
+from dataclasses import replace
+from contextlib import contextmanager
 
 import coverage
+import numpy as np
+import torch
 
 from Nova2 import *
-from Nova2.app.context_data import ContextSource_User
+from Nova2.app.context_data import ContextSource_User, ContextSource_Voice, ContextDatapoint, Context
+from Nova2.app.context_manager import ContextManager
+from Nova2.app.audio_buffer import AudioRingBuffer, AudioChunkQueue
+from Nova2.app.audio_source import ArraySource, StreamingResampler
+from Nova2.app.vad import StreamingVAD
+from Nova2.app.stt_multiprocess import SharedAudioRingBuffer
+from Nova2.app.metrics import PipelineMetrics
+from Nova2.app.transcription_cadence import TranscriptionCadence
+from Nova2.app.database_manager import MemoryEmbeddingDatabaseManager, IdSequence, EmbeddingCache, LazyEmbeddingModel, VoiceEmbeddingIndex, VoiceDatabaseManager
+from Nova2.app.stt_manager import VoiceAnalysis, VoiceProcessingHelpers
+from Nova2.app.stt_service import STTBatcher, MultiStreamSTT
+from Nova2.app.stt_data import STTConditioning, Word, LanguageLock
+from Nova2.app.interfaces import STTInferenceEngineBase
+from Nova2.app.helpers import Singleton
+from Nova2.inference_engines.inference_stt.inference_fasterwhisper import InferenceEngineFasterWhisper
 
 class Test(unittest.TestCase):
     def setUp(self):
@@ -68,6 +93,816 @@ class Test(unittest.TestCase):
 
         resp = self.nova.run_tts("Hello World")
 
+class TestAudioRingBuffer(unittest.TestCase):
+    def test_wraparound_view(self):
+        buffer = AudioRingBuffer(capacity=8, block_size=3)
+
+        for i in range(4):
+            buffer.write(np.arange(i * 3, i * 3 + 3, dtype=np.float32))
+            buffer.release(buffer.write_position)
+
+        view = buffer.read(4, 12)
+
+        self.assertEqual(view.tolist(), list(range(4, 12)))
+        self.assertIs(view.base, buffer._buffer)
+        self.assertFalse(view.flags.writeable)
+        self.assertEqual(buffer.overruns, 0)
+
+    def test_overrun(self):
+        buffer = AudioRingBuffer(capacity=8, block_size=4)
+
+        for i in range(3):
+            buffer.write(np.full(4, i, dtype=np.float32))
+
+        self.assertEqual(buffer.overruns, 1)
+        self.assertEqual(buffer.overrun_samples, 4)
+        self.assertEqual(buffer.read(0, 12).tolist(), [1] * 4 + [2] * 4)
+
+    def test_chunk_queue_overflow(self):
+        merging = AudioChunkQueue(maxsize=2, overflow_policy="merge")
+        dropping = AudioChunkQueue(maxsize=2, overflow_policy="drop_oldest")
+
+        for queue in (merging, dropping):
+            for i in range(4):
+                queue.put(i * 10, i * 10 + 10)
+            queue.close()
+
+        self.assertEqual([merging.get(), merging.get(), merging.get()], [(0, 10), (10, 40), None])
+        self.assertEqual([dropping.get(), dropping.get(), dropping.get()], [(20, 30), (30, 40), None])
+        self.assertEqual((merging.merged, dropping.dropped), (2, 2))
+
+    def test_chunk_queue_blocking_put(self):
+        queue = AudioChunkQueue(maxsize=1, overflow_policy="drop_oldest")
+        queue.put(0, 10)
+
+        # A blocking put waits for the consumer instead of dropping the pending chunk
+        threading.Timer(0.05, queue.get).start()
+        queue.put(10, 20, block=True)
+
+        self.assertEqual(queue.get(timeout=0), (10, 20))
+        self.assertEqual(queue.dropped, 0)
+
+    def test_chunk_queue_wait_time(self):
+        queue = AudioChunkQueue(maxsize=2, overflow_policy="merge")
+
+        # Only the time a chunk spends in the queue counts, not the time the consumer waits for it
+        threading.Timer(0.1, queue.put, args=(0, 10)).start()
+        queue.get(timeout=1)
+        self.assertLess(queue.last_wait, 0.05)
+
+        queue.put(10, 20)
+        time.sleep(0.1)
+        queue.put(20, 30)
+        queue.put(30, 40) # Merged into the pending chunk, which keeps the time of its first part
+        self.assertEqual(queue.get(timeout=0), (10, 20))
+        self.assertGreaterEqual(queue.last_wait, 0.1)
+        self.assertEqual(queue.get(timeout=0), (20, 40))
+        self.assertLess(queue.last_wait, 0.05)
+
+    def test_shared_memory_attach(self):
+        owner = SharedAudioRingBuffer(capacity=8)
+        attached = SharedAudioRingBuffer(capacity=8, name=owner.name)
+
+        owner.write(np.arange(10, dtype=np.float32))
+
+        self.assertEqual(attached.write_position, 10)
+        self.assertEqual(attached.read(0, 10).tolist(), list(range(2, 10)))
+
+        attached.close()
+        owner.close()
+
+class TestAudioSource(unittest.TestCase):
+    def test_array_replay(self):
+        blocks = []
+
+        source = ArraySource(np.arange(4000, dtype=np.float32), speed=0)
+        source.start(callback=blocks.append, sample_rate=16000, block_size=1600)
+
+        while not source.finished:
+            time.sleep(0.01)
+
+        source.stop()
+
+        self.assertEqual([len(block) for block in blocks], [1600, 1600, 800])
+        self.assertEqual(np.concatenate(blocks).tolist(), list(range(4000)))
+
+    def test_streaming_resampler(self):
+        from scipy.signal import resample_poly
+
+        audio = np.random.default_rng(0).standard_normal(44100).astype(np.float32)
+
+        resampler = StreamingResampler(source_rate=44100, target_rate=16000)
+        chunks = [resampler.process(audio[i:i + 4410]) for i in range(0, len(audio), 4410)]
+        chunks.append(resampler.flush())
+
+        # Resampling chunk by chunk must not leave artifacts at the chunk boundaries
+        np.testing.assert_allclose(np.concatenate(chunks), resample_poly(audio, 160, 441), atol=1e-5)
+
+class TestStreamingVAD(unittest.TestCase):
+    class LoudnessModel:
+        """
+        Stands in for the silero model. Classifies frames by their loudness.
+        """
+        def __init__(self):
+            self.calls = 0
+            self.resets = 0
+
+        def reset_states(self):
+            self.resets += 1
+
+        def __call__(self, frame, sample_rate):
+            self.calls += 1
+            return frame.abs().mean() * 10
+
+    def test_speech_boundaries_and_gate(self):
+        model = self.LoudnessModel()
+        vad = StreamingVAD(model=model, threshold=0.5, min_silence_ms=300, speech_pad_ms=0)
+
+        audio = np.zeros(48000, dtype=np.float32)
+        audio[16384:32768] = 0.3 * np.sin(np.arange(16384, dtype=np.float32) / 5)
+
+        events = []
+        for i in range(0, len(audio), 1000): # Chunks that do not align with the frames
+            events += vad.process(audio[i:i + 1000])
+
+        self.assertEqual([(event.kind, event.position) for event in events], [("start", 16384), ("end", 32768)])
+        self.assertEqual(vad.stats["frames_rejected_gate"], 61)
+        self.assertEqual(model.calls, 32)
+
+    def test_gate_keeps_model_state_in_speech(self):
+        model = self.LoudnessModel()
+        vad = StreamingVAD(model=model, threshold=0.5, min_silence_ms=300, speech_pad_ms=0)
+
+        audio = np.zeros(48000, dtype=np.float32)
+        audio[16384:32768] = 0.3 * np.sin(np.arange(16384, dtype=np.float32) / 5)
+        audio[24576:25088] = 0 # A single quiet frame inside the speech
+
+        vad.process(audio)
+
+        # Only the long silence before the speech resets the state, besides the reset on creation
+        self.assertEqual(model.resets, 2)
+        self.assertEqual(vad.stats["frames_rejected_gate"], 62)
+
+class TestVoiceAnalysisPipeline(unittest.TestCase):
+    class RecordingEngine(STTInferenceEngineBase):
+        """
+        Stands in for the inference engine. Records the audio it was asked to transcribe.
+        """
+        def __init__(self):
+            self.audio = []
+
+        def initialize_model(self, conditioning):
+            pass
+
+        def free(self):
+            pass
+
+        @property
+        def input_format(self):
+            return "numpy"
+
+        def run_inference(self, audio_data, prompt="", language_lock=None):
+            self.audio.append(np.array(audio_data))
+            return [Word(text=" test", start=0.0, end=len(audio_data) / 16000)]
+
+    class RecordingVADModel:
+        """
+        Stands in for the silero model. Records the frames it analyzed and classifies every frame as speech.
+        """
+        def __init__(self):
+            self.frames = []
+
+        def reset_states(self):
+            pass
+
+        def __call__(self, frame, sample_rate):
+            self.frames.append(frame.numpy().copy())
+            return torch.tensor(1.0)
+
+    def setUp(self):
+        self.database = temporary_voice_database() # VoiceAnalysis opens the voice database
+        self.database.__enter__()
+
+    def tearDown(self):
+        self.database.__exit__(None, None, None)
+
+    def create_pipeline(self, audio_source: ArraySource | None = None, **kwargs) -> tuple[VoiceAnalysis, "TestVoiceAnalysisPipeline.RecordingEngine", "TestVoiceAnalysisPipeline.RecordingVADModel"]:
+        engine = self.RecordingEngine()
+        vad_model = self.RecordingVADModel()
+
+        pipeline = VoiceAnalysis()
+        pipeline.configure(STTConditioning(model="", inference_engine="", device="cpu", audio_source=audio_source or ArraySource(np.zeros(1, dtype=np.float32)), vad_gate_enabled=False, endpoint_mode="punctuation", **kwargs))
+        pipeline.apply_config(inference_engine=engine, speaker_embedding_model=object()) # type: ignore
+        pipeline._session.vad._model = vad_model
+
+        return pipeline, engine, vad_model
+
+    def test_dropped_chunks_are_skipped(self):
+        pipeline, engine, vad_model = self.create_pipeline(audio_queue_size=1, audio_overflow_policy="drop_oldest")
+        session = pipeline._session
+        queue = pipeline._audio_queue
+
+        # Every sample holds its own position, so it can be traced through the pipeline
+        for start in (0, 4800, 9600):
+            session.ring_buffer.write(0.5 + np.arange(start, start + 4800, dtype=np.float32) / 1e5)
+            queue.put(start, start + 4800)
+
+        chunk = queue.get(timeout=0)
+        self.assertEqual(chunk, (9600, 14400))
+        self.assertEqual(queue.dropped, 2)
+
+        pipeline._process_chunk(session, *chunk)
+
+        positions = lambda audio: np.round((audio - 0.5) * 1e5).astype(int)
+
+        # Neither the VAD nor the transcription see the audio of the dropped chunks
+        self.assertGreaterEqual(min(positions(frame).min() for frame in vad_model.frames), 9600)
+        self.assertEqual(len(engine.audio), 1)
+        self.assertEqual(positions(engine.audio[0]).min(), 9600)
+        self.assertEqual(positions(engine.audio[0]).max(), 14399)
+        self.assertEqual(session.ring_buffer.read_position, 9600)
+
+        pipeline.close()
+
+    def test_failing_consumer_releases_replay_source(self):
+        # The replay is longer than the buffer, so the source waits for the consumer to make room
+        source = ArraySource(np.full(16000 * 10, 0.5, dtype=np.float32), speed=0)
+        pipeline, engine, _ = self.create_pipeline(audio_source=source, audio_buffer_seconds=2.0)
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("Inference failed")
+        engine.run_inference = fail
+
+        with self.assertRaises(RuntimeError):
+            list(pipeline.start())
+
+        pipeline._recording_thread.join(timeout=5)
+        self.assertFalse(pipeline._recording_thread.is_alive())
+
+        pipeline.close()
+
+    def test_endpoint_flush_only_after_speech(self):
+        pipeline, _, _ = self.create_pipeline()
+        pipeline._conditioning = replace(pipeline._conditioning, endpoint_mode="silence", endpoint_silence_ms=700)
+        session = pipeline._session
+        session.utterance_start = 0
+        session.vad.last_speech_position = 16000
+
+        session.vad.in_speech = True
+        pipeline._request_endpoint_flush(session)
+        self.assertIsNone(pipeline._flush_position)
+
+        session.vad.in_speech = False
+        pipeline._request_endpoint_flush(session)
+        self.assertEqual(pipeline._flush_position, 16000 + 11200)
+
+        # Once the recording thread handed the audio over, the same pause is not flushed again
+        pipeline._flush_position = None
+        pipeline._request_endpoint_flush(session)
+        self.assertIsNone(pipeline._flush_position)
+
+        pipeline.close()
+
+    def test_worker_transcription_does_not_block(self):
+        pipeline, engine, _ = self.create_pipeline()
+        session = pipeline._session
+
+        # Stands in for a transcription that is still running in a worker process
+        future = Future()
+        pipeline._run_asr = lambda *args, **kwargs: future
+
+        session.ring_buffer.write(np.full(4800, 0.5, dtype=np.float32))
+        pipeline._process_chunk(session, 0, 4800)
+        self.assertIsNotNone(session.pending_transcription)
+
+        future.set_result([Word(text=" Hello", start=0.0, end=0.3)])
+        pipeline._apply_pending_transcription(session, wait=False)
+
+        self.assertIsNone(session.pending_transcription)
+        self.assertEqual([word.text for word in session.current_sentence], [" Hello"])
+
+        pipeline.close()
+
+    def test_speaker_embedding_segments_are_capped(self):
+        pipeline, _, _ = self.create_pipeline(speaker_embedding_max_seconds=5.5)
+        session = pipeline._session
+        session.utterance_start = 0
+        session.speech_segments = [[0, 16000], [24000, 104000], [110000, None]]
+
+        # The longest segment fits completely, the middle of the next longest one fills the rest
+        segments = pipeline._embedding_segments(session, utterance_end=120000)
+        self.assertEqual(segments, [(4000, 12000), (24000, 104000)])
+        self.assertEqual(sum(end - start for start, end in segments), int(5.5 * 16000))
+
+        # Short utterances are used completely
+        pipeline._conditioning = replace(pipeline._conditioning, speaker_embedding_max_seconds=10.0)
+        self.assertEqual(pipeline._embedding_segments(session, utterance_end=120000), [(0, 16000), (24000, 104000), (110000, 120000)])
+
+        pipeline.close()
+
+    def test_segment_embedding_is_weighted_by_length(self):
+        class RecordingEmbeddingModel:
+            def encode_batch(self, batch, wav_lens):
+                self.batch, self.wav_lens = batch, wav_lens
+                return torch.eye(len(batch), 4).unsqueeze(1) # Every segment gets its own direction
+
+        model = RecordingEmbeddingModel()
+        segments = [torch.ones(8000), torch.ones(32000), torch.ones(64000)]
+
+        embedding = VoiceProcessingHelpers.generate_segment_embedding(model, segments) # type: ignore
+
+        # The half second segment is padded to the minimum length of one second
+        self.assertEqual(tuple(model.batch.shape), (3, 64000))
+        self.assertTrue(torch.allclose(model.wav_lens, torch.tensor([0.25, 0.5, 1.0])))
+        self.assertTrue(torch.allclose(embedding.reshape(-1), torch.tensor([0.25, 0.5, 1.0, 0.0]) / 1.75))
+
+    def test_calibrate_reuses_one_engine(self):
+        pipeline, _, _ = self.create_pipeline()
+
+        class CalibrationEngine(self.RecordingEngine):
+            """
+            Only transcribes the whole reference with a beam size of 5. Can not load int8 models.
+            """
+            def __init__(self):
+                super().__init__()
+                self.loaded = []
+                self.freed = 0
+
+            def initialize_model(self, conditioning):
+                if conditioning.compute_type == "int8":
+                    raise RuntimeError("int8 is not supported")
+                self.conditioning = conditioning
+                self.loaded.append((conditioning.compute_type, conditioning.beam_size))
+
+            def free(self):
+                self.freed += 1
+
+            def run_inference(self, audio_data, prompt="", language_lock=None):
+                text = ["hello", "world"] if self.conditioning.beam_size == 5 else ["hello"]
+                return [Word(text=f" {word}", start=0.0, end=0.5) for word in text]
+
+        engines = []
+        def request_engine(name, eng_type):
+            engines.append(CalibrationEngine())
+            return engines[-1]
+        pipeline._inference_engine_manager.request_engine = request_engine # type: ignore
+
+        with warnings.catch_warnings(record=True) as skipped:
+            warnings.simplefilter("always")
+            result = pipeline.calibrate(np.zeros(16000, dtype=np.float32), "Hello world.", compute_types=("float32", "int8"), beam_sizes=(1, 5), runs=1)
+
+        self.assertEqual(len(skipped), 2) # The int8 combinations
+
+        self.assertEqual(len(engines), 1)
+        self.assertEqual(engines[0].loaded, [("float32", 1), ("float32", 5)])
+        self.assertEqual(engines[0].freed, 1)
+        self.assertEqual(len(result["results"]), 2)
+        self.assertEqual((result["recommended"]["compute_type"], result["recommended"]["beam_size"]), ("float32", 5))
+
+        pipeline.close()
+
+    def test_incremental_transcription_merges_overlap(self):
+        pipeline, engine, _ = self.create_pipeline(incremental_transcription=True, transcription_overlap=0.5)
+        session = pipeline._session
+
+        # A word is spoken every half second. The engine reads the position of the audio it got from the samples
+        # and returns the words that lie completely inside it, relative to the start of the audio
+        def run_inference(audio_data, prompt="", language_lock=None):
+            engine.audio.append(np.array(audio_data))
+            window_start = int(np.round((audio_data[0] - 0.5) * 1e5)) / 16000
+            window_end = window_start + len(audio_data) / 16000
+            words = []
+            for k in range(int(window_end / 0.5) + 1):
+                start, end = k * 0.5 + 0.05, k * 0.5 + 0.4
+                if start >= window_start and end <= window_end:
+                    words.append(Word(text=f" w{k}", start=start - window_start, end=end - window_start))
+            return words
+        engine.run_inference = run_inference
+
+        committed_positions = []
+        for start in range(0, 16000 * 6, 4800):
+            session.ring_buffer.write(0.5 + np.arange(start, start + 4800, dtype=np.float32) / 1e5)
+            pipeline._process_chunk(session, start, start + 4800)
+            committed_positions.append(session.committed_position)
+
+            # Every word that has been spoken completely is transcribed exactly once
+            spoken = [f" w{k}" for k in range(12) if k * 0.5 + 0.4 <= (start + 4800) / 16000]
+            self.assertEqual([word.text for word in session.current_sentence], spoken)
+
+        self.assertEqual(committed_positions, sorted(committed_positions))
+        self.assertGreater(committed_positions[-1], 16000 * 4)
+
+        # The last passes only decoded the audio after the committed words
+        self.assertLess(len(engine.audio[-1]), 16000 * 2)
+
+        pipeline.close()
+
+class TestLanguageLock(unittest.TestCase):
+    class FakeWhisperModel:
+        """
+        Stands in for the whisper model. Reports a fixed language detection and records the language it was asked to decode with.
+        """
+        def __init__(self):
+            self.language = "de"
+            self.probability = 0.95
+            self.avg_logprob = -0.2
+            self.used_languages = []
+
+        def transcribe(self, audio, language=None, **kwargs):
+            self.used_languages.append(language)
+            segment = types.SimpleNamespace(avg_logprob=self.avg_logprob, words=[types.SimpleNamespace(word=" Hallo", start=0.0, end=0.3)])
+            detected = self.language if isinstance(self.language, str) else self.language.pop(0) # A list detects one language per call
+            return [segment], types.SimpleNamespace(language=detected, language_probability=self.probability)
+
+    def create_engine(self, **kwargs) -> tuple[InferenceEngineFasterWhisper, "TestLanguageLock.FakeWhisperModel"]:
+        engine = InferenceEngineFasterWhisper()
+        engine._conditioning = STTConditioning(model="", inference_engine="", **kwargs)
+        engine._model = self.FakeWhisperModel() # type: ignore
+        return engine, engine._model # type: ignore
+
+    def test_lock_recheck_and_reset(self):
+        engine, model = self.create_engine(language_recheck_seconds=60.0)
+        audio = np.zeros(1600, dtype=np.float32)
+        lock = LanguageLock()
+
+        engine.run_inference(audio, language_lock=lock)
+        engine.run_inference(audio, language_lock=lock)
+        self.assertEqual(model.used_languages, [None, "de"])
+        self.assertEqual(lock.language, "de")
+
+        # Another stream sharing the engine detects its own language
+        other_lock = LanguageLock()
+        engine.run_inference(audio, language_lock=other_lock)
+        self.assertIsNone(model.used_languages[-1])
+
+        # The locked language is detected again once it is older than the recheck interval
+        lock.locked_at -= 60.0
+        engine.run_inference(audio, language_lock=lock)
+        self.assertIsNone(model.used_languages[-1])
+        self.assertEqual(lock.language, "de")
+
+        # A transcription with low confidence releases the lock
+        model.avg_logprob = -2.0
+        engine.run_inference(audio, language_lock=lock)
+        self.assertEqual(model.used_languages[-1], "de")
+        self.assertIsNone(lock.language)
+
+        # An uncertain detection does not lock the language
+        model.avg_logprob = -0.2
+        model.probability = 0.5
+        engine.run_inference(audio, language_lock=lock)
+        self.assertIsNone(lock.language)
+
+        # Streams locked to different languages are not decoded in the same language
+        model.used_languages = []
+        engine.run_batch_inference([audio, audio], language_locks=[LanguageLock("de", time.monotonic()), LanguageLock("en", time.monotonic())])
+        self.assertEqual(sorted(model.used_languages), ["de", "en"])
+
+        # Every stream without a locked language detects its own
+        model.used_languages = []
+        model.language = ["de", "en"]
+        model.probability = 0.95
+        locks = [LanguageLock(), LanguageLock()]
+        engine.run_batch_inference([audio, audio], language_locks=locks) # type: ignore
+        self.assertEqual(model.used_languages, [None, None])
+        self.assertEqual([lock.language for lock in locks], ["de", "en"])
+
+    def test_new_session_detects_again(self):
+        with temporary_voice_database():
+            pipeline = VoiceAnalysis()
+            pipeline.configure(STTConditioning(model="", inference_engine="", device="cpu", audio_source=ArraySource(np.zeros(1, dtype=np.float32))))
+            pipeline.apply_config(inference_engine=TestVoiceAnalysisPipeline.RecordingEngine(), speaker_embedding_model=object()) # type: ignore
+
+            pipeline._session.language_lock.language = "de"
+            self.assertIsNone(pipeline._create_session(vad_model=pipeline._vad_model).language_lock.language)
+
+            pipeline.close()
+
+class TestSTTBatcher(unittest.TestCase):
+    def test_waiting_audio_is_copied(self):
+        engine = TestVoiceAnalysisPipeline.RecordingEngine()
+        batcher = STTBatcher(engine=engine, max_batch_size=2, max_batch_wait=0.2)
+
+        audio = np.full(1600, 0.5, dtype=np.float32)
+        view = audio[:]
+        view.flags.writeable = False
+
+        future = batcher.submit(view)
+        audio[:] = 0.0 # The ring buffer overwrites the audio while the request waits for a second one
+        future.result(timeout=5)
+        batcher.close()
+
+        self.assertTrue(np.all(engine.audio[0] == 0.5))
+
+    def test_service_reuses_loaded_models(self):
+        engine = TestVoiceAnalysisPipeline.RecordingEngine()
+        freed = []
+        engine.free = lambda: freed.append(engine) # type: ignore
+        speaker_embedding_model = object()
+
+        with temporary_voice_database():
+            service = MultiStreamSTT(STTConditioning(model="", inference_engine="", device="cpu"), inference_engine=engine, speaker_embedding_model=speaker_embedding_model) # type: ignore
+            stream = service.add_stream(ArraySource(np.zeros(1, dtype=np.float32)))
+
+            self.assertIs(service._engine, engine)
+            self.assertIs(stream._speaker_embedding_model, speaker_embedding_model)
+
+            service.close()
+        self.assertEqual(freed, []) # The engine belongs to whoever handed it in
+
+class TestContextRevisions(unittest.TestCase):
+    def setUp(self):
+        self.manager = ContextManager()
+        self._previous_state = (self.manager._context_file, self.manager.context_data)
+
+        self.manager._context_file = "debug_ctx" # Only marks the context as initialized, nothing is saved
+        self.manager.context_data = []
+
+    def tearDown(self):
+        self.manager._context_file, self.manager.context_data = self._previous_state
+
+    def revision(self, content: str, revision: int, final: bool) -> ContextDatapoint:
+        return ContextDatapoint(
+            source=ContextSource_Voice(speaker="Alice" if final else "Unknown", utterance_id="utterance", revision=revision, final=final),
+            content=content
+            )
+
+    def test_revisions_replace_in_place(self):
+        self.manager.add_to_context(self.revision("Hello", revision=1, final=False))
+        self.manager.add_to_context(ContextDatapoint(source=ContextSource_User(), content="Typed message"))
+        self.manager.add_to_context(self.revision("Hello there.", revision=2, final=True))
+        self.manager.add_to_context(self.revision("Hello", revision=1, final=False)) # Arrives late and must not replace the newer revision
+
+        contents = [datapoint["content"] for datapoint in self.manager.context_data]
+        self.assertEqual(contents, ["Hello there.", "Typed message"])
+        self.assertEqual(self.manager.context_data[0]["source"]["metadata"]["speaker"], "Alice")
+
+    def test_partial_revisions_are_not_sent_to_the_llm(self):
+        context = Context(data_points=[self.revision("Hello", revision=1, final=False)])
+        self.assertEqual(len(context.to_conversation()._conversation), 0)
+
+@contextmanager
+def temporary_voice_database():
+    """
+    Replaces the voice database singleton with one that stores its data in a temporary folder.
+    """
+    previous = Singleton._instances.pop(VoiceDatabaseManager, None)
+
+    with tempfile.TemporaryDirectory() as folder:
+        manager = VoiceDatabaseManager(db_path=Path(folder))
+        try:
+            yield manager
+        finally:
+            manager._qdrant_client.close()
+            Singleton._instances.pop(VoiceDatabaseManager, None)
+            if previous is not None:
+                Singleton._instances[VoiceDatabaseManager] = previous
+
+class TestVoiceEmbeddingIndex(unittest.TestCase):
+    def test_add_rename_remove_and_search(self):
+        index = VoiceEmbeddingIndex(dimensions=4, initial_capacity=1)
+        index.add("a", "Alice", np.array([1, 0, 0, 0]))
+        index.add("b", "Bob", np.array([0, 1, 0, 0]))
+        index.add("c", "Alice", np.array([0, 0, 1, 0])) # Two voices can share a name
+
+        self.assertEqual(index.search(np.array([0, 0.9, 0.1, 0]))[:2], ("b", "Bob")) # type: ignore
+        self.assertEqual(index.get_id("Alice"), "a")
+
+        index.rename("a", "Carol")
+        self.assertEqual(index.get_id("Alice"), "c")
+        self.assertEqual(index.get_id("Carol"), "a")
+
+        index.remove("b")
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.get_id("Bob"))
+        self.assertEqual(index.search(np.array([0, 0, 1, 0]))[:2], ("c", "Alice")) # type: ignore | Moved into the row of the removed voice
+        self.assertEqual(index.search(np.array([1, 0, 0, 0]))[:2], ("a", "Carol")) # type: ignore
+
+        index.remove("c")
+        self.assertIsNone(index.get_id("Alice"))
+
+    def test_singleton_keeps_index(self):
+        with temporary_voice_database():
+            index = VoiceDatabaseManager()._index
+            self.assertIs(VoiceDatabaseManager()._index, index)
+
+class TestVoiceArchive(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.database = temporary_voice_database()
+        self.manager = self.database.__enter__()
+        self.manager._tts_voice_path = Path(self.folder.name) / "voices"
+        self.manager._tts_voice_path.mkdir()
+
+    def tearDown(self):
+        self.database.__exit__(None, None, None)
+        self.folder.cleanup()
+
+    def test_export_import_round_trip(self):
+        archive = Path(self.folder.name) / "voices.npz"
+        embedding = torch.rand(512)
+        np.save(self.manager._tts_voice_path / "narrator.npy", np.ones((2, 4), dtype=np.float32))
+
+        self.manager.create_voice(embedding, "ArchiveVoice")
+        self.manager.export_voices(archive)
+
+        # The exported voice is renamed locally and keeps its ID. Importing it again must not overwrite it
+        self.manager.edit_voice_name("ArchiveVoice", "RenamedArchiveVoice")
+        (self.manager._tts_voice_path / "narrator.npy").unlink()
+
+        self.manager.import_voices(archive)
+
+        self.assertTrue(self.manager.does_voice_exist("RenamedArchiveVoice"))
+        self.assertTrue(self.manager.does_voice_exist("ArchiveVoice"))
+        self.assertNotEqual(self.manager._index.get_id("ArchiveVoice"), self.manager._index.get_id("RenamedArchiveVoice"))
+        self.assertTrue(np.array_equal(np.load(self.manager._tts_voice_path / "narrator.npy"), np.ones((2, 4), dtype=np.float32)))
+
+    def test_rejects_paths_in_voice_names(self):
+        archive = Path(self.folder.name) / "voices.npz"
+
+        with open(archive, "wb") as file:
+            np.savez(
+                file,
+                speaker_ids=np.array([], dtype=str),
+                speaker_names=np.array([], dtype=str),
+                speaker_embeddings=np.zeros((0, 512), dtype=np.float32),
+                tts_names=np.array(["../escaped"], dtype=str),
+                tts_embeddings=np.ones((1, 4), dtype=np.float32)
+            )
+
+        with self.assertRaises(Exception):
+            self.manager.import_voices(archive)
+
+        self.assertFalse((Path(self.folder.name) / "escaped.npy").exists())
+
+class TestPipelineMetrics(unittest.TestCase):
+    def test_histograms_and_export(self):
+        metrics = PipelineMetrics(stages=("asr",), counters=("chunks",))
+
+        metrics.observe("asr", 0.03)
+        metrics.observe("asr", 0.3)
+        metrics.increment("chunks")
+        metrics.record_real_time_factor(audio_seconds=2.0, processing_seconds=0.5)
+
+        data = metrics.to_dict()
+        self.assertEqual(data["stages"]["asr"]["count"], 2)
+        self.assertEqual(data["counters"]["chunks"], 1)
+        self.assertEqual(data["real_time_factor"]["overall"], 0.25)
+
+        text = metrics.to_prometheus(prefix="nova_stt")
+        self.assertIn('nova_stt_stage_duration_seconds_bucket{stage="asr",le="0.05"} 1', text)
+        self.assertIn('nova_stt_stage_duration_seconds_bucket{stage="asr",le="+Inf"} 2', text)
+        self.assertIn("nova_stt_chunks_total 1", text)
+
+class TestTranscriptionCadence(unittest.TestCase):
+    def test_interval_follows_latency_within_bounds(self):
+        cadence = TranscriptionCadence(min_interval=0.3, max_interval=2.0, headroom=1.5, smoothing=0.5)
+
+        # A slow transcription stretches the interval, but never beyond the longest interval
+        for _ in range(10):
+            cadence.record_latency(5.0)
+            self.assertLessEqual(cadence.update(queue_depth=0, lag=0.0), 2.0)
+        self.assertEqual(cadence.interval, 2.0)
+
+        # A fast transcription shortens it again, but never below the shortest interval
+        intervals = []
+        for _ in range(20):
+            cadence.record_latency(0.01)
+            intervals.append(cadence.update(queue_depth=0, lag=0.0))
+        self.assertEqual(intervals, sorted(intervals, reverse=True))
+        self.assertTrue(all(0.3 <= interval <= 2.0 for interval in intervals))
+        self.assertEqual(cadence.interval, 0.3)
+
+        # In between, the interval follows the latency and grows with the chunks waiting in the queue
+        cadence.latency = 0.4
+        self.assertAlmostEqual(cadence.update(queue_depth=0, lag=0.0), 0.6)
+        self.assertAlmostEqual(cadence.update(queue_depth=1, lag=1.0), 1.2)
+
+    def test_rejects_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            TranscriptionCadence(min_interval=0.0)
+        with self.assertRaises(ValueError):
+            TranscriptionCadence(min_interval=1.0, max_interval=0.5)
+
+class TestEmbeddingCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = EmbeddingCache(max_entries=2, max_bytes=1024)
+
+        cache.put("a", torch.zeros(16))
+        cache.put("b", torch.zeros(16))
+        self.assertIsNotNone(cache.get("a")) # "b" is now the least recently used entry
+        cache.put("c", torch.zeros(16))
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+        cache.put("d", torch.zeros(256)) # Exceeds the memory limit together with the other entries
+        self.assertEqual(cache.stats["entries"], 1)
+        self.assertEqual(cache.stats["hits"], 2)
+        self.assertEqual(cache.stats["misses"], 1)
+
+class TestIdSequence(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / "ids.json"
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_concurrent_reservations_are_unique(self):
+        sequence = IdSequence(self.path)
+        reserved = [[] for _ in range(8)]
+
+        def reserve(ids: list):
+            for _ in range(200):
+                ids.extend(sequence.reserve(3))
+
+        threads = [threading.Thread(target=reserve, args=(ids,)) for ids in reserved]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ids = [id for thread_ids in reserved for id in thread_ids]
+        self.assertEqual(len(ids), 4800)
+        self.assertEqual(len(set(ids)), 4800)
+        self.assertEqual(sequence.next_id, 4800)
+
+    def test_continues_after_reload(self):
+        sequence = IdSequence(self.path, initial_value=10)
+        self.assertEqual(list(sequence.reserve(2)), [10, 11])
+
+        # The persisted sequence wins over the initial value
+        reloaded = IdSequence(self.path, initial_value=0)
+        self.assertEqual(reloaded.next_id, 12)
+        self.assertEqual(list(reloaded.reserve()), [12])
+        self.assertFalse(self.path.with_suffix(".tmp").exists())
+
+class TestMemoryAreas(unittest.TestCase):
+    class RecordingClient:
+        """
+        Stands in for the qdrant client. Holds one entry per ID and records the IDs of every retrieve request.
+        """
+        def __init__(self, ids: list[int]):
+            self.ids = set(ids)
+            self.requests = []
+
+        def retrieve(self, collection_name, ids, **kwargs):
+            self.requests.append(list(ids))
+            return [types.SimpleNamespace(id=id, payload={"text": f"entry {id}"}) for id in ids if id in self.ids]
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+        # Bypasses the singleton and the database setup, only the state _query_areas uses is created
+        self.manager = object.__new__(MemoryEmbeddingDatabaseManager)
+        self.manager._ids = IdSequence(Path(self.folder.name) / "ids.json", initial_value=20)
+        self.manager._qdrant_client = self.RecordingClient(list(range(20))) # type: ignore
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_overlapping_areas_are_retrieved_once(self):
+        areas = self.manager._query_areas([1, 3], 2)
+
+        self.assertEqual(self.manager._qdrant_client.requests, [[0, 1, 2, 3, 4, 5]]) # type: ignore
+        self.assertEqual(areas, [[f"entry {id}" for id in range(0, 4)], [f"entry {id}" for id in range(1, 6)]])
+
+    def test_gaps_between_areas_are_not_retrieved(self):
+        areas = self.manager._query_areas([12, 4], 1)
+
+        self.assertEqual(self.manager._qdrant_client.requests, [[3, 4, 5, 11, 12, 13]]) # type: ignore
+        self.assertEqual(areas, [["entry 11", "entry 12", "entry 13"], ["entry 3", "entry 4", "entry 5"]])
+
+    def test_areas_are_clamped_to_existing_ids(self):
+        self.manager._qdrant_client.ids.discard(18) # type: ignore | A deleted entry leaves a gap
+
+        areas = self.manager._query_areas([0, 19], 3)
+
+        self.assertEqual(self.manager._qdrant_client.requests, [[0, 1, 2, 3, 16, 17, 18, 19]]) # type: ignore
+        self.assertEqual(areas, [["entry 0", "entry 1", "entry 2", "entry 3"], ["entry 16", "entry 17", "entry 19"]])
+
+class TestLazyEmbeddingModel(unittest.TestCase):
+    class FakeModel:
+        def encode(self, texts, **kwargs):
+            return np.zeros((len(texts), 4), dtype=np.float32)
+
+    def test_unloads_when_idle(self):
+        model = LazyEmbeddingModel("", idle_timeout=0.1)
+        model._model = self.FakeModel() # Stands in for the loaded model
+
+        model.encode(["a"])
+        watcher = model._unload_thread
+        model.encode(["b"])
+        self.assertIs(model._unload_thread, watcher) # Using the model again does not start another thread
+
+        time.sleep(0.05)
+        self.assertTrue(model.is_loaded)
+
+        watcher.join(timeout=2) # type: ignore
+        self.assertFalse(model.is_loaded)
+        self.assertIsNone(model._unload_thread)
+
 def run_tests():
     cov = coverage.Coverage(
         source=['.'],
@@ -85,7 +920,25 @@ def run_tests():
     )
     cov.start()
     
-    suite = unittest.TestLoader().loadTestsFromTestCase(Test)
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite([
+        loader.loadTestsFromTestCase(Test),
+        loader.loadTestsFromTestCase(TestAudioRingBuffer),
+        loader.loadTestsFromTestCase(TestAudioSource),
+        loader.loadTestsFromTestCase(TestStreamingVAD),
+        loader.loadTestsFromTestCase(TestVoiceAnalysisPipeline),
+        loader.loadTestsFromTestCase(TestLanguageLock),
+        loader.loadTestsFromTestCase(TestSTTBatcher),
+        loader.loadTestsFromTestCase(TestContextRevisions),
+        loader.loadTestsFromTestCase(TestVoiceEmbeddingIndex),
+        loader.loadTestsFromTestCase(TestVoiceArchive),
+        loader.loadTestsFromTestCase(TestLazyEmbeddingModel),
+        loader.loadTestsFromTestCase(TestPipelineMetrics),
+        loader.loadTestsFromTestCase(TestTranscriptionCadence),
+        loader.loadTestsFromTestCase(TestEmbeddingCache),
+        loader.loadTestsFromTestCase(TestIdSequence),
+        loader.loadTestsFromTestCase(TestMemoryAreas)
+    ])
     unittest.TextTestRunner().run(suite)
     
     cov.stop()